@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from consts import Config
+
+
+class ChordShape(NamedTuple):
+    """ How a chord is played on the guitar """
+    base: int  # The fret the diagram starts at (1 = the nut)
+    frets: Tuple[int, ...]  # The fret of each string, lowest first (-1 = not played, 0 = open)
+
+    @property
+    def barre(self) -> bool:
+        """ Whether a finger has to hold down several strings (ie. no string is open, and the lowest fret is shared) """
+        pressed = [fret for fret in self.frets if fret > 0]
+        return bool(pressed) and 0 not in self.frets and pressed.count(min(pressed)) > 1
+
+
+class ChordSymbol(NamedTuple):
+    """ The name of a chord, split into its parts - with every note spelled the one way we spell it """
+    root: str  # eg. C# (or the whole name of a chord without a root, eg. NC)
+    quality: str  # eg. m7
+    bass: str  # The bass note of a slash chord (eg. E, of Am/E), if any
+
+    def __str__(self) -> str:
+        return self.root + self.quality + ('/' + self.bass if self.bass else '')
+
+
+"""
+Every chord we know how to play, compiled from Config.CHORDS_FILE.
+In the file, a chord either has a fingering, or copies another chord. Compiled, every chord name (and every alias of it)
+is spelled one way - sharps rather than flats, and one name per quality (eg. m rather than min) - and maps straight
+to its fingering; chords which are played the same share one. The compiled chords are saved, and only compiled again
+if the file changes.
+"""
+class ChordDictionary:
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'chords.pickle')
+    # Bump this whenever compiling changes, so that chords compiled by an older version are compiled again
+    COMPILE_VERSION: int = 1
+
+    NOTES: List[str] = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    # The same notes, spelled with flats (as they're written in flat keys; the dictionary only uses NOTES)
+    FLAT_NOTES: List[str] = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
+    PITCHES: Dict[str, int] = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+    ACCIDENTALS: Dict[str, int] = {'': 0, '#': 1, 'b': -1}
+    # The root, quality and (optional) bass note of a chord
+    RE_CHORD_SYMBOL = re.compile('^([A-G])([#b]?)(.*?)(?:/([A-G])([#b]?))?$')
+
+    _instance: Optional['ChordDictionary'] = None
+
+    def __init__(self, chords_file: str = Config.CHORDS_FILE, cache_file: str = CACHE_FILE):
+        self.chords_file = chords_file
+        self.cache_file = cache_file
+        # Every distinct fingering
+        self.shapes: List[ChordShape] = []
+        # chord name -> the index of its fingering
+        self.chords: Dict[str, int] = {}
+        # quality -> the way we spell it (eg. min -> m)
+        self.qualities: Dict[str, str] = {}
+        # chord name (as written in a song) -> its symbol
+        self.symbols: Dict[str, ChordSymbol] = {}
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'ChordDictionary':
+        """ Returns the shared dictionary, loading it on first use """
+        if cls._instance is None or cls._instance.chords_file != Config.CHORDS_FILE:
+            cls._instance = ChordDictionary(Config.CHORDS_FILE)
+        return cls._instance
+
+    @classmethod
+    def note(cls, letter: str, accidental: str, shift: int = 0, flats: bool = False) -> str:
+        """
+        The way we spell the given note (eg. Bb -> A#), or the note the given number of semitones above it
+        @param flats: Whether to spell it with flats instead (eg. A# -> Bb), as in a flat key
+        """
+        return (cls.FLAT_NOTES if flats else cls.NOTES)[(cls.PITCHES[letter] + cls.ACCIDENTALS[accidental] + shift) % 12]
+
+    @classmethod
+    def parse(cls, name: str) -> ChordSymbol:
+        """ Splits a chord name into its root, quality & bass note - spelling the notes our way, but not the quality """
+        name = name.strip().replace('♭', 'b').replace('♯', '#')
+        match = cls.RE_CHORD_SYMBOL.match(name)
+        if not match:
+            return ChordSymbol(name, '', '')
+
+        letter, accidental, quality, bass_letter, bass_accidental = match.groups()
+        return ChordSymbol(cls.note(letter, accidental), quality, cls.note(bass_letter, bass_accidental) if bass_letter else '')
+
+    def symbol(self, name: str) -> ChordSymbol:
+        """ The symbol of a chord, spelled the way the dictionary spells it """
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            symbol = self.parse(name)
+            symbol = symbol._replace(quality=self.qualities.get(symbol.quality, symbol.quality))
+            self.symbols[name] = symbol
+        return symbol
+
+    def split(self, name: str) -> List[str]:
+        """ The chords a chord name stands for: just the chord, or every chord of a few written as one (eg. Am/E7/Am) """
+        symbol = self.symbol(name)
+        if '/' in symbol.quality:
+            return [chord for chord in name.split('/') if chord.strip()]
+        return [name]
+
+    def shape(self, name: str) -> Optional[ChordShape]:
+        """ How the given chord is played (or None, if we don't know the chord) """
+        index = self.chords.get(str(self.symbol(name)))
+        return None if index is None else self.shapes[index]
+
+    @classmethod
+    def compile(cls, chords: Dict[str, Dict]) -> Tuple[List[ChordShape], Dict[str, int], Dict[str, str]]:
+        """
+        Compiles the chords of a chords file
+        @param chords: chord name -> either {"base", "frets"}, or {"copy": the name of another chord}
+        @return: Every distinct fingering, the fingering of every chord, and the spelling of every quality
+        """
+        # Follow every copy to the chord it (eventually) copies
+        resolved: Dict[str, str] = {}
+        for name in chords:
+            seen = [name]
+            while "copy" in chords[seen[-1]]:
+                copied = chords[seen[-1]]["copy"]
+                if copied not in chords:
+                    raise ValueError(f"Chord '{seen[-1]}' copies '{copied}', which isn't a chord")
+                if copied in seen:
+                    raise ValueError(f"Chord '{name}' copies itself (through {' -> '.join(seen)})")
+                seen.append(copied)
+            resolved[name] = seen[-1]
+
+        # A copy of the same chord under another quality (eg. Cmin of Cm) makes that quality a synonym, for every root
+        qualities: Dict[str, str] = {}
+        conflicting = set()
+        for name, chord in chords.items():
+            if "copy" not in chord:
+                continue
+            symbol, copied = cls.parse(name), cls.parse(resolved[name])
+            if (symbol.root, symbol.bass) != (copied.root, copied.bass) or symbol.quality == copied.quality:
+                continue
+            if qualities.setdefault(symbol.quality, copied.quality) != copied.quality:
+                conflicting.add(symbol.quality)
+        qualities = {quality: spelling for quality, spelling in qualities.items()
+                     if quality not in conflicting and spelling not in qualities}
+
+        shapes: Dict[ChordShape, int] = {}
+        compiled: Dict[str, int] = {}
+        for name in chords:
+            symbol = cls.parse(name)
+            symbol = str(symbol._replace(quality=qualities.get(symbol.quality, symbol.quality)))
+            # The first chord under a name wins (chords are listed by their usual spelling first)
+            if symbol in compiled:
+                continue
+            chord = chords[resolved[name]]
+            compiled[symbol] = shapes.setdefault(ChordShape(chord["base"], tuple(chord["frets"])), len(shapes))
+
+        return list(shapes), compiled, qualities
+
+    def _load(self) -> None:
+        with open(self.chords_file, 'rb') as f:
+            source = f.read()
+        source_hash = hashlib.sha1(source).hexdigest()
+
+        try:
+            with open(self.cache_file, 'rb') as f:
+                version, cached_hash, compiled = pickle.load(f)
+            if (version, cached_hash) == (self.COMPILE_VERSION, source_hash):
+                self.shapes, self.chords, self.qualities = compiled
+                return
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            pass
+
+        self.shapes, self.chords, self.qualities = self.compile(json.loads(source.decode('utf-8')))
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump((self.COMPILE_VERSION, source_hash, (self.shapes, self.chords, self.qualities)), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
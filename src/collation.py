@@ -0,0 +1,94 @@
+import os
+import pickle
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+from pyuca import Collator
+
+from consts import Config
+
+
+"""
+Sorts titles the way a Ukrainian reader expects.
+Укр. sorting doesn't work as expected if using default sort funcs - in particular, Ї & є are out of order by unicode key.
+The collation table is only loaded once (and only if a key isn't cached); every title's key is memoized,
+and saved between builds.
+"""
+class Collation:
+    KEYS_FILE: str = os.path.join(Config.CACHE_DIR, 'sort_keys.pickle')
+
+    # The default collation (DUCET) treats these as variants of the preceding letter (eg. Ї as І with a diaeresis).
+    #   In the Ukrainian alphabet they are letters of their own, sorted right after it
+    UKRAINIAN_LETTERS: Dict[str, str] = {'Ґ': 'Г', 'ґ': 'г', 'Ї': 'І', 'ї': 'і'}
+
+    _instance: Optional['Collation'] = None
+
+    def __init__(self, keys_file: str = KEYS_FILE, tailored: bool = True):
+        self.keys_file = keys_file
+        self.tailored = tailored
+        self._collator: Optional[Collator] = None
+        # title -> sort key
+        self.keys: Dict[str, Tuple] = {}
+        self.dirty = False
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'Collation':
+        """ Returns the shared collation, loading it on first use """
+        if cls._instance is None or cls._instance.tailored != Config.UKRAINIAN_COLLATION:
+            cls._instance = Collation(tailored=Config.UKRAINIAN_COLLATION)
+        return cls._instance
+
+    @property
+    def collator(self) -> Collator:
+        """ The collator; parsing the collation table is slow, so we only do it when we first need it """
+        self.load_collator()
+        return self._collator
+
+    def load_collator(self) -> None:
+        """ Parses the collation table, unless it's already parsed (eg. to do it while idle, before it's needed) """
+        if self._collator is None:
+            self._collator = Collator()
+            if self.tailored:
+                self._tailor(self._collator)
+
+    def sort_key(self, title: str) -> Tuple:
+        key = self.keys.get(title)
+        if key is None:
+            key = self.collator.sort_key(title)
+            self.keys[title] = key
+            self.dirty = True
+        return key
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.keys_file), exist_ok=True)
+        with open(self.keys_file, 'wb') as f:
+            pickle.dump((self._version(), self.keys), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _version(self) -> Tuple:
+        """ The keys are only valid for the same collation table and tailoring """
+        return Collator.UCA_VERSION, self.tailored
+
+    def _load(self) -> None:
+        try:
+            with open(self.keys_file, 'rb') as f:
+                version, keys = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return
+
+        if version == self._version():
+            self.keys = keys
+
+    def _tailor(self, collator: Collator) -> None:
+        """ Gives each Ukrainian-only letter a primary weight of its own, between its base letter and the next one """
+        for letter, base in self.UKRAINIAN_LETTERS.items():
+            elements = [list(element) for element in collator.collation_elements(base)]
+            # Primary weights are whole numbers, so this sorts after the base letter, but before the next letter
+            elements[0][0] += 0.5
+            decomposed = unicodedata.normalize('NFD', letter)
+            collator.table.add([ord(c) for c in decomposed], elements)
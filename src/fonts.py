@@ -0,0 +1,116 @@
+import collections.abc
+import hashlib
+import os
+import pickle
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from fpdf.ttfonts import TTFontFile
+
+from consts import Config
+
+FONTS_DIR: str = os.path.normpath(os.path.join(Config.ROOT_DIR, 'assets/fonts'))
+
+
+"""
+The metrics of our fonts (glyph widths, and the font descriptor), parsed from each TTF file once.
+Parsed fonts are kept in memory, and saved (one file per font) keyed on the hash of the TTF file, so a font is only
+parsed again if its file changes. Only the families the config actually uses are ever loaded.
+"""
+class FontCache:
+    CACHE_DIR: str = os.path.join(Config.CACHE_DIR, 'fonts')
+
+    # The TTF file of every family & style we can render in
+    FONT_FILES: Dict[Tuple[str, str], str] = {
+        ("Poiret One", ''): 'poiret_one.ttf',
+        ("Caveat", ''): 'caveat.ttf',
+        ("Open Sans", ''): 'open_sans.ttf',
+        ("Open Sans", 'B'): 'open_sans_bold.ttf',
+        ("Open Sans", 'I'): 'open_sans_italic.ttf',
+        ("Futura Futuris C", ''): 'futura_futuris_c.ttf',
+        ("Futura Futuris C", 'B'): 'futura_futuris_c_bold.ttf',
+        ("Futura Futuris C", 'I'): 'futura_futuris_c_italic.ttf',
+        ("Futura Futuris C Light", ''): 'futura_futuris_c_light.ttf',
+        ("Ubuntu", ''): 'ubuntu.ttf',
+        ("Ubuntu", 'I'): 'ubuntu_italic.ttf',
+        ("Ubuntu", 'B'): 'ubuntu_bold.ttf',
+        ("Ubuntu Light", ''): 'ubuntu_light.ttf',
+        ("Ubuntu Light", 'B'): 'ubuntu.ttf',
+    }
+
+    _instance: Optional['FontCache'] = None
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        # TTF path -> parsed font
+        self.fonts: Dict[str, Dict] = {}
+
+    @classmethod
+    def get(cls) -> 'FontCache':
+        """ Returns the shared cache """
+        if cls._instance is None:
+            cls._instance = FontCache()
+        return cls._instance
+
+    @classmethod
+    def families(cls) -> Set[str]:
+        """ Every font family the current config uses (ie. of any Config font) """
+        return {value["family"] for name, value in vars(Config).items()
+                if name.isupper() and isinstance(value, collections.abc.Mapping) and "family" in value}
+
+    @classmethod
+    def font_files(cls, families: Set[str]) -> List[Tuple[str, str, str]]:
+        """ The family, style and TTF path of every style of the given families (always in the same order) """
+        return [(family, style, os.path.join(FONTS_DIR, filename))
+                for (family, style), filename in cls.FONT_FILES.items() if family in families]
+
+    def cache_file(self, ttffile: str) -> str:
+        """ Where the parsed font of the given TTF file is saved """
+        with open(ttffile, 'rb') as f:
+            return os.path.join(self.cache_dir, hashlib.sha1(f.read()).hexdigest() + '.pkl')
+
+    def font(self, ttffile: str) -> Dict:
+        """ Returns the parsed font of the given TTF file, only parsing it if it isn't cached """
+        font = self.fonts.get(ttffile)
+        if font is not None:
+            return font
+
+        cache_file = self.cache_file(ttffile)
+        try:
+            with open(cache_file, 'rb') as f:
+                font = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            font = self._parse(ttffile)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_file, 'wb') as f:
+                pickle.dump(font, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # The same file may have moved since it was cached
+        font = dict(font, ttffile=ttffile, unifilename=cache_file)
+        self.fonts[ttffile] = font
+        return font
+
+    @staticmethod
+    def _parse(ttffile: str) -> Dict:
+        """ Reads the metrics of a TTF file, the same way FPDF.add_font does """
+        ttf = TTFontFile()
+        ttf.getMetrics(ttffile)
+        desc = {
+            'Ascent': int(round(ttf.ascent, 0)),
+            'Descent': int(round(ttf.descent, 0)),
+            'CapHeight': int(round(ttf.capHeight, 0)),
+            'Flags': ttf.flags,
+            'FontBBox': "[%s %s %s %s]" % tuple(int(round(b, 0)) for b in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV, 0)),
+            'MissingWidth': int(round(ttf.defaultWidth, 0)),
+        }
+        return {
+            'name': re.sub('[ ()]', '', ttf.fullName),
+            'type': 'TTF',
+            'desc': desc,
+            'up': round(ttf.underlinePosition),
+            'ut': round(ttf.underlineThickness),
+            'originalsize': os.stat(ttffile).st_size,
+            'cw': ttf.charWidths,
+        }
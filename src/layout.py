@@ -0,0 +1,348 @@
+import hashlib
+import itertools
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fpdf import FPDF
+
+from consts import Config
+from metrics import FontMetrics
+from song.chordpro import Directive, LyricLine
+
+
+class SongLayout(NamedTuple):
+    """ The measurements of a song, as laid out at the top of a page """
+    meta_height: float
+    lyrics: Dict[str, float]  # The dimensions of the lyrics (in one or two columns, whichever they're rendered in)
+    split: Optional[int]  # The index of the line between the two columns, if the song can be split
+    columns: Optional[Tuple[Dict[str, float], Dict[str, float]]]  # The dimensions of each of the two columns
+    pages: int  # The number of pages the song spans
+
+
+"""
+Measures the blocks of a song (meta, one- and two-column lyrics) from the font metrics and line structure alone,
+without emitting anything into a PDF.
+Every measurement follows the same steps the renderer takes (down to automatic page breaks), so the results
+are exactly what rendering the block on a fresh page would give.
+"""
+class SongMeasurer:
+    # Bump this whenever measuring changes, so that layouts measured by an older version aren't reused
+    LAYOUT_VERSION: int = 4
+    # Every Config value the measurements depend on
+    LAYOUT_CONFIG: Tuple[str, ...] = (
+        "PDF_UNIT", "PDF_WIDTH", "PDF_HEIGHT", "PDF_MARGIN_TOP", "PDF_MARGIN_LEFT", "PDF_MARGIN_RIGHT",
+        "PDF_MARGIN_BOTTOM", "USABLE_PAGE_WIDTH", "PDF_INDENT", "MIN_COLUMN_MARGIN", "MAX_COLUMN_MARGIN",
+        "MIN_SONG_HEIGHT", "SONG_TITLE_MARGIN", "LINE_HEIGHT", "TITLE_FONT", "SUBTITLE_FONT", "BODY_FONT", "CHORD_FONT",
+        "SONG_CHORD_DIAGRAMS", "SONG_CHORD_DIAGRAM_SCALE", "CHORD_WIDTH", "CHORD_HEIGHT", "CHORD_MARGIN_HORIZONTAL",
+        "CHORD_MARGIN_VERTICAL",
+    )
+
+    def __init__(self, pdf: FPDF, metrics: FontMetrics):
+        """
+        @param pdf: The PDF whose page geometry we measure for
+        @param metrics: The metrics of the fonts registered on that PDF
+        """
+        self.metrics = metrics
+        self.k = pdf.k
+        self.page_width = pdf.w
+        self.top_margin = pdf.t_margin
+        self.left_margin = pdf.l_margin
+        self.right_margin = pdf.r_margin
+        self.cell_margin = pdf.c_margin
+        self.page_break_trigger = pdf.page_break_trigger
+        # The number of page breaks we've measured so far
+        self.page_breaks = 0
+        self.fingerprint = self.config_fingerprint()
+
+    @classmethod
+    def config_fingerprint(cls) -> str:
+        """ A hash of everything the measurements depend on (besides the song itself) """
+        values = [cls.LAYOUT_VERSION] + [(name, getattr(Config, name)) for name in cls.LAYOUT_CONFIG]
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    def _width(self, font: Tuple[str, float], string: str) -> float:
+        return self.metrics.string_width(font[0], font[1], string)
+
+    @staticmethod
+    def _font(font: Dict) -> Tuple[str, float]:
+        return FontMetrics.font_key(font), font["size"]
+
+    def _cell(self, y: float, h: float) -> float:
+        """ Returns the Y-coordinate of the bottom of a cell of height h placed at y, breaking the page if needed """
+        if y + h > self.page_break_trigger:
+            y = self.top_margin
+            self.page_breaks += 1
+        return y + h
+
+    def count_lines(self, text: str, font: Dict) -> int:
+        """
+        Counts the lines a full-width multi_cell splits the given text into
+        @param text: The text
+        @param font: The font the text is in
+        """
+        font_key, size = self._font(font)
+        font_size = size / self.k
+        w = self.page_width - self.right_margin - self.left_margin
+        wmax = (w - 2 * self.cell_margin) * 1000.0 / font_size
+
+        s = text.replace("\r", '')
+        nb = len(s)
+        if nb > 0 and s[nb - 1] == "\n":
+            nb -= 1
+
+        sep = -1
+        i = 0
+        j = 0
+        width = 0
+        num_lines = 1
+        while i < nb:
+            c = s[i]
+            if c == "\n":
+                # Explicit line break
+                i += 1
+                sep = -1
+                j = i
+                width = 0
+                num_lines += 1
+                continue
+
+            if c == ' ':
+                sep = i
+            width += self.metrics.string_width(font_key, size, c) / font_size * 1000.0
+
+            if width > wmax:
+                # Automatic line break
+                if sep == -1:
+                    if i == j:
+                        i += 1
+                else:
+                    i = sep + 1
+                sep = -1
+                j = i
+                width = 0
+                num_lines += 1
+            else:
+                i += 1
+
+        return num_lines
+
+    def measure_meta(self, directives: List[Directive], diagrams: int = 0) -> float:
+        """
+        Measures the height of the given metadata (see PDF.render_meta), and the chord diagrams under it
+        @param directives: A list containing the metadata directives
+        @param diagrams: The number of chord diagrams shown under the metadata (see PDF.render_song_diagrams)
+        """
+        return self._measure_meta(directives, self.top_margin, diagrams) - self.top_margin
+
+    @staticmethod
+    def diagrams_per_row() -> int:
+        """ How many of a song's chord diagrams fit side by side """
+        width = Config.CHORD_WIDTH * Config.SONG_CHORD_DIAGRAM_SCALE
+        margin = Config.CHORD_MARGIN_HORIZONTAL * Config.SONG_CHORD_DIAGRAM_SCALE
+        return max(1, int((Config.USABLE_PAGE_WIDTH + margin) // (width + margin)))
+
+    @staticmethod
+    def diagram_row_height() -> float:
+        """ The height of a row of a song's chord diagrams (as tall as a diagram which notes its base fret) """
+        # The chord name, the base fret & the open strings above the fretboard (see PDF._draw_chord)
+        height = Config.BODY_FONT["size"] + 7 + 7 + 3 + Config.CHORD_HEIGHT
+        return (height + Config.CHORD_MARGIN_VERTICAL) * Config.SONG_CHORD_DIAGRAM_SCALE
+
+    def _measure_meta(self, directives: List[Directive], start_y: float, diagrams: int = 0) -> float:
+        """ Returns the Y-coordinate the given metadata (and the chord diagrams under it) ends at, if it starts at start_y """
+        y = start_y
+        for directive in directives:
+            if directive.command == 'title':
+                font = Config.TITLE_FONT
+            elif directive.command == 'subtitle':
+                font = Config.SUBTITLE_FONT
+            else:
+                continue
+
+            for _ in range(self.count_lines(directive.args, font)):
+                y = self._cell(y, font["size"])
+
+        if diagrams:
+            rows = -(-diagrams // self.diagrams_per_row())
+            y = self._cell(y, rows * self.diagram_row_height())
+
+        return y
+
+    def split_index(self, lines: List[LyricLine]) -> Optional[int]:
+        """
+        Finds the best place to split a given song into two columns (if possible).
+        Every blank line is considered; we pick the one which makes the taller column as short as possible,
+        while leaving at least MIN_COLUMN_MARGIN between the columns (and fitting onto a page)
+        @param lines: The lines of the song
+        @return: The index of the (blank) line between the two columns, or None if no split works
+        """
+        # First - find the indexes of every linebreak in the song
+        breaks = [i for i, v in enumerate(lines) if v.blank]
+
+        if len(breaks) == 0:
+            return
+
+        # Measure every line once (lines with chords are about twice as tall as those without)
+        heights = [0.0]  # heights[i] = the total height of the first i lines
+        widths = []
+        for line in lines:
+            dims = self.measure_one_col([line], 0, 0)[0]
+            heights.append(heights[-1] + dims['h'] - Config.SONG_TITLE_MARGIN)
+            widths.append(dims['w'])
+
+        # The widest line before (and after) each line
+        widest_before = list(itertools.accumulate(widths, max, initial=0))
+        widest_after = list(itertools.accumulate(reversed(widths), max, initial=0))[::-1]
+
+        best = None
+        for i in breaks:
+            col1_height = Config.SONG_TITLE_MARGIN + heights[i]
+            col2_height = Config.SONG_TITLE_MARGIN + heights[-1] - heights[i + 1]
+            space_left = Config.USABLE_PAGE_WIDTH - (widest_before[i] + widest_after[i + 1])
+
+            if (space_left >= Config.MIN_COLUMN_MARGIN
+                    and min(col1_height, col2_height) > Config.MIN_SONG_HEIGHT
+                    and self.top_margin + max(col1_height, col2_height) + Config.PDF_MARGIN_BOTTOM <= Config.PDF_HEIGHT):
+                # Ties go to the break closest to the middle of the song
+                key = (max(col1_height, col2_height), abs(i - 1 - len(lines) // 2))
+                if best is None or key < best[0]:
+                    best = (key, i)
+
+        return best[1] if best else None
+
+    def measure_song(self, meta: List[Directive], lines: List[LyricLine], diagrams: int = 0) -> SongLayout:
+        """
+        Measures everything we need to lay out a song
+        @param meta: The metadata directives of the song
+        @param lines: The lyrics of the song
+        @param diagrams: The number of chord diagrams shown under the metadata
+        """
+        split = self.split_index(lines)
+        columns = None
+        lyrics = None
+
+        if split is not None:
+            col1, col2 = lines[:split], lines[split+1:]
+            columns = (self.measure_one_col(col1, self.top_margin)[0], self.measure_one_col(col2, self.top_margin)[0])
+            margin = self.column_margin(columns[0], columns[1], self.top_margin)
+            if margin > 0:
+                lyrics = self.measure_two_col(col1, col2, margin, self.top_margin)[0]
+
+        if lyrics is None:
+            lyrics = self.measure_one_col(lines, self.top_margin)[0]
+
+        # Then follow the whole song down from the top of a page, to see how many pages it spans
+        self.page_breaks = 0
+        y = self._measure_meta(meta, self.top_margin, diagrams)
+        margin = self.column_margin(columns[0], columns[1], y) if columns else -1
+        if margin > 0:
+            self.measure_two_col(lines[:split], lines[split+1:], margin, y)
+        else:
+            self.measure_one_col(lines, y)
+
+        return SongLayout(self.measure_meta(meta, diagrams), lyrics, split, columns, 1 + self.page_breaks)
+
+    def measure_lyrics(self, lines: List[LyricLine]) -> Dict[str, float]:
+        """
+        Measures the given lyrics, laid out the way PDF.render_lyrics would on a fresh page
+        @param lines: A list of lyrics
+        """
+        return self.measure_song([], lines).lyrics
+
+    @staticmethod
+    def column_margin(col1_dims: Dict[str, float], col2_dims: Dict[str, float], y: float) -> float:
+        """
+        Calculates the horizontal margin between the two columns
+        @param col1_dims: The dimensions of the first column
+        @param col2_dims: The dimensions of the second column
+        @param y: The Y-coordinate the columns would start at
+        @return: The horizontal margin, or -1 if the two columns do not fit all the requirements (eg. are shorter than
+            the minimum height, are too wide, etc).
+        """
+        # Check how much space we would have left if we rendered in two cols
+        space_left = Config.USABLE_PAGE_WIDTH - (col1_dims['w'] + col2_dims['w'])
+        enough_space_left = space_left >= Config.MIN_COLUMN_MARGIN
+
+        # Check if both columns are at least the minimum height
+        cols_match_min_height = (col1_dims['h'] > Config.MIN_SONG_HEIGHT and col2_dims['h'] > Config.MIN_SONG_HEIGHT)
+
+        # Check if this song will fit onto the page
+        total_height = y + max(col1_dims['h'], col2_dims['h']) + Config.PDF_MARGIN_BOTTOM
+        song_fits_height = total_height <= Config.PDF_HEIGHT
+
+        if enough_space_left and cols_match_min_height and song_fits_height:
+            return min(space_left, Config.MAX_COLUMN_MARGIN)
+
+        return -1
+
+    def measure_two_col(self, col1: List[LyricLine], col2: List[LyricLine], margin_size: float,
+                        start_y: float) -> Tuple[Dict[str, float], float]:
+        """
+        Measures song lyrics in two columns (see PDF._render_lyrics_two_col)
+        @return: The dimensions of the lyrics, and the Y-coordinate they end at
+        """
+        col1_dims, end_y = self.measure_one_col(col1, start_y)
+        start_x = col1_dims['w'] + margin_size + Config.PDF_MARGIN_LEFT
+        col2_dims, col2_end_y = self.measure_one_col(col2, start_y, start_x)
+
+        return {
+            'h': max(col1_dims['h'], col2_dims['h']),
+            'w': col1_dims['w'] + col2_dims['w']
+        }, max(end_y, col2_end_y)
+
+    def measure_one_col(self, lines: List[LyricLine], start_y: float,
+                        start_x=Config.PDF_MARGIN_LEFT) -> Tuple[Dict[str, float], float]:
+        """
+        Measures the given lyrics in a single column (see PDF._render_lyrics_one_col)
+        @param lines: A list of lines
+        @param start_y: The starting Y coordinate of the lyrics
+        @param start_x: The starting X coordinate of the lyrics
+        @return: The dimensions of the lyrics, and the Y-coordinate they end at
+        """
+        body_font = self._font(Config.BODY_FONT)
+        bold_font = self._font({"family": Config.BODY_FONT["family"], "style": 'UI', "size": Config.BODY_FONT["size"]})
+        chord_font = self._font(Config.CHORD_FONT)
+        chord_height = Config.CHORD_FONT["size"]
+        body_height = Config.BODY_FONT["size"]
+
+        y = start_y + Config.SONG_TITLE_MARGIN
+        max_x = 0
+
+        for line in lines:
+            x = start_x
+            if line.indented:
+                x = start_x + Config.PDF_INDENT
+
+            font = bold_font if line.bold else body_font
+
+            if line.chords:
+                min_x = x
+                for line_segment, chord in line.segments():
+                    x = x + self._width(font, line_segment)
+                    if chord is None:
+                        continue
+
+                    # The chord is measured in the line's font, but printed in the chord font
+                    width = self._width(font, chord)
+                    x = max(x, min_x)
+                    y_after = self._cell(y, chord_height)
+                    y = y_after - chord_height
+                    # A zero-width cell stretches to the right margin
+                    x = x + (width if width != 0 else self.page_width - self.right_margin - x)
+                    min_x = x + self._width(chord_font, " ")
+                    max_x = max(x, max_x)
+                    x = x - width
+                    font = body_font
+
+                # Linebreak
+                y = y + chord_height
+                y = y + Config.LINE_HEIGHT
+
+            x = start_x + (Config.PDF_INDENT if line.indented else 0)
+            max_x = max(self._width(font, line.text) + x, max_x)
+            y = self._cell(y, body_height)
+            y = y + Config.LINE_HEIGHT
+
+        return {
+            'h': y - start_y,
+            'w': max_x - start_x,
+        }, y
@@ -0,0 +1,79 @@
+import os
+import pickle
+from typing import Dict, Optional, Tuple
+
+from consts import Config
+from layout import SongLayout, SongMeasurer
+from song.corpus import SongCorpus
+from song.song import Song
+
+
+"""
+A cache of measured song layouts, saved as a single file.
+Each layout is keyed on the hash of the song file's contents (and the number of chord diagrams shown with it), and
+a fingerprint of the Config values the layout depends on - so reordering sections, or changing anything which doesn't
+affect layout, reuses every song's layout.
+"""
+class LayoutCache:
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'song_layouts.pickle')
+
+    _instance: Optional['LayoutCache'] = None
+
+    def __init__(self, corpus: SongCorpus, cache_file: str = CACHE_FILE):
+        self.corpus = corpus
+        self.cache_file = cache_file
+        # (layout fingerprint, content hash, chord diagrams) -> layout
+        self.layouts: Dict[Tuple[str, str, int], SongLayout] = {}
+        self.dirty = False
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'LayoutCache':
+        """ Returns the shared cache, loading it on first use """
+        if cls._instance is None:
+            cls._instance = LayoutCache(SongCorpus.get())
+        return cls._instance
+
+    def layout(self, song: Song, measurer: SongMeasurer, diagrams: int = 0) -> SongLayout:
+        """
+        Returns the layout of the given song, only measuring it if it isn't cached
+        @param diagrams: The number of chord diagrams shown with the song (see PDF.song_diagrams)
+        """
+        key = (measurer.fingerprint, song.content_hash, diagrams)
+        layout = self.layouts.get(key)
+
+        if layout is None:
+            layout = measurer.measure_song(song.meta, song.lyrics, diagrams)
+            self.layouts[key] = layout
+            self.dirty = True
+
+        return layout
+
+    def merge(self, layouts: Dict[Tuple[str, str, int], SongLayout]) -> None:
+        """ Adds the layouts measured elsewhere (eg. by another process) to the cache """
+        new = layouts.keys() - self.layouts.keys()
+        if new:
+            self.layouts.update((key, layouts[key]) for key in new)
+            self.dirty = True
+
+    def save(self) -> None:
+        """ Saves the cache (if anything changed), dropping the songs which are no longer in the corpus """
+        if not self.dirty:
+            return
+
+        current = {entry["hash"] for entry in self.corpus.files.values()}
+        layouts = {key: layout for key, layout in self.layouts.items() if key[1] in current}
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump(layouts, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'rb') as f:
+                self.layouts = pickle.load(f)
+        # Layouts saved by an older version may no longer load at all (eg. if SongLayout changed)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            return
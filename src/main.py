@@ -1,50 +1,183 @@
 #!/usr/bin/env python3
-import json
-from pyuca import Collator
+import sys
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+from collation import Collation
+from layout_cache import LayoutCache
+from page_cache import PageCache
+from consts import BuildConfig
 from song.song import *
+from song.song_cache import ParsedSongCache
+from song.wikispiv_cache import WikiSpivCache
 from render import render_pdf
+from transpose import Transposer
+from utils import Utils
+from voicings import Voicings
 
 
-def load_content_and_config(config_file: str):
-    """ Using the given JSON config file, update our configs and return the songs list """
-    with open(config_file, encoding='utf-8') as f:
-        conf_obj = json.load(f)
+def resolve_songs(config: BuildConfig) -> None:
+    """ Makes sure we have every song of the given songbook locally """
+    # Resolve every song we don't have locally in a few batched queries, rather than one song at a time
+    song_titles = config.song_titles()
+    WikiSpivSong.resolve_titles(song_titles)
+    # Then download all the missing songs at once
+    WikiSpivSong.prefetch_songs(song_titles)
 
 
-    sections = None
-    for key, v in conf_obj.items():
-        if key == 'sections':
-            sections = v
-        elif hasattr(Config, key):
-            setattr(Config, key, Config.updateDict(getattr(Config, key), v))
-
-    # Update some dependent variables
-    Config.USABLE_PAGE_WIDTH = Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT)
-    Config.USABLE_PAGE_HEIGHT = Config.PDF_HEIGHT - (Config.PDF_MARGIN_BOTTOM + Config.PDF_MARGIN_TOP)
-    Config.CHORD_HEIGHT = Config.CHORD_STRING_HEIGHT + 3  # The height of the strings + fretboard
-
-    return sections
-
-
-def main(config_file: str, outfile: str):
-    content = load_content_and_config(config_file)
-
+def load_sections(config: BuildConfig) -> List[Tuple[str, List[Song], bool]]:
+    """ Loads the songs of every section of the given songbook, in the order they'll be rendered """
     sections = []
-    
-    for section_name, songs, should_sort in content:
+
+    for section_name, songs, should_sort in config.sections:
         print(f'** Processing section {section_name}')
         songs = [Song(song.strip()) for song in songs]
         songs = [s for s in songs if s is not None]
+        # Transpose the songs (if configured to), from the chords they were parsed into
+        songs = [Transposer.get().transpose(song, section_name) for song in songs]
 
         # Укр. sorting doesn't work as expected if using default sort funcs
         #   In particular - Ї & є are out of order by unicode key
         if should_sort:
-            songs.sort(key=lambda s: Collator().sort_key(s.title))
+            songs.sort(key=lambda s: Collation.get().sort_key(s.title))
 
         sections.append((section_name, songs, should_sort))
 
+    return sections
+
+
+def main(config_file: str, outfile: str):
+    start = time.perf_counter()
+    config = BuildConfig(config_file)
+    config.apply()
+
+    resolve_songs(config)
+    sections = load_sections(config)
+    # Only the songs which were edited since the last build had to be parsed; keep them for the next one
+    WikiSpivCache.get().save()
+    ParsedSongCache.get().save()
+    loaded = time.perf_counter()
+
     print("Rendering...")
     render_pdf(sections, os.path.join(Config.ROOT_DIR, outfile))
+    rendered = time.perf_counter()
+    Collation.get().save()
+    LayoutCache.get().save()
+    PageCache.get().save()
+    Voicings.get().save()
+
+    print(f"Built {outfile} in {time.perf_counter() - start:.2f}s "
+          f"(songs {loaded - start:.2f}s, rendering {rendered - loaded:.2f}s)")
+
+
+def _render_build(config: BuildConfig, sections: List[Tuple[str, List[Song], bool]], outfile: str):
+    """ Renders a single songbook of a batch (in a worker process), and returns what it added to the caches """
+    config.apply()
+    print(f"Rendering {outfile}...", flush=True)
+    render_pdf(sections, os.path.join(Config.ROOT_DIR, outfile))
+    return LayoutCache.get().layouts, PageCache.get().used_pages(), Voicings.get().shapes
+
+
+def build_all(builds: List[Tuple], max_workers: int = None):
+    """
+    Builds several songbooks at once.
+    The songs are found, downloaded, parsed and sorted once (in this process), and shared by every songbook;
+    the songbooks are then rendered side by side in worker processes, each with its own configuration.
+    @param builds: The config file & output file of each songbook, and optionally the values to override the config
+        file's with (eg. to build a variant of a songbook, in other keys)
+    @param max_workers: The max. number of songbooks rendered at the same time (the number of CPUs by default)
+    """
+    start = time.perf_counter()
+    configs = [(BuildConfig(config_file, *overrides), outfile) for config_file, outfile, *overrides in builds]
+
+    books = []
+    for config, outfile in configs:
+        print(f"Loading {config.config_file}")
+        # Each songbook is loaded with its own configuration, and leaves Config as it found it for the next
+        with config.applied():
+            resolve_songs(config)
+            books.append((config, load_sections(config), outfile))
+
+    WikiSpivCache.get().save()
+    ParsedSongCache.get().save()
+    Collation.get().save()
+    loaded = time.perf_counter()
+
+    with Utils.process_pool(max_workers) as executor:
+        results = executor.map(_render_build, *zip(*books))
+        for layouts, pages, voicings in results:
+            LayoutCache.get().merge(layouts)
+            PageCache.get().merge(pages)
+            Voicings.get().merge(voicings)
+
+    LayoutCache.get().save()
+    PageCache.get().save()
+    Voicings.get().save()
+
+    print(f"Built {len(books)} songbooks in {time.perf_counter() - start:.2f}s "
+          f"(songs {loaded - start:.2f}s, rendering {time.perf_counter() - loaded:.2f}s)")
+
+
+def _watched_files(config_file: str) -> Dict[str, Tuple[int, int]]:
+    """ The modification time & size of the config file, and of every song file """
+    paths = [config_file]
+    with os.scandir(Song.SONG_DIR) as it:
+        paths += [entry.path for entry in it if entry.name.endswith('.cho')]
+
+    files = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Editors which save by writing a new file & renaming it over the old one leave a moment without it;
+            #   the file shows up (as changed) on the next check
+            continue
+        files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def watch(config_file: str, outfile: str, interval: Optional[float] = None):
+    """
+    Builds the songbook, and then builds it again every time a song or the config file is saved.
+    Everything we've loaded (the corpus, parsed songs, the collator & sort keys, layouts and pages) stays in memory
+    between builds, so a rebuild only parses, measures and renders what changed.
+    @param interval: Seconds between checks for changes (Config.WATCH_INTERVAL, by default)
+    """
+    print(f"Watching {Song.SONG_DIR} and {config_file} for changes (Ctrl+C to stop)")
+    built = None
+
+    try:
+        while True:
+            try:
+                files = _watched_files(config_file)
+                if files != built:
+                    built = files
+                    # Pick up added & renamed songs, and titles changed in the edited ones
+                    SongCorpus.get().refresh()
+                    main(config_file, outfile)
+                    # Load the collation table while we're idle, rather than on the build after a title is edited
+                    Collation.get().load_collator()
+            except Exception:
+                # A half-written song (or config) shouldn't stop us; the next save will trigger another build
+                traceback.print_exc()
+            # (the config file we just built may set the interval)
+            time.sleep(interval if interval is not None else Config.WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
 
 
-main("../configs/lsh-spivanyk.json", 'output/2024-01-lsh.pdf')
+if __name__ == '__main__':
+    if '--watch' in sys.argv:
+        watch("../configs/lsh-spivanyk.json", 'output/2024-01-lsh.pdf')
+    elif '--all' in sys.argv:
+        build_all([("../configs/lsh-spivanyk.json", 'output/2024-01-lsh.pdf'),
+                   ("../configs/lsh-velyka-vatra.json", 'output/lsh-velyka-vatra.pdf'),
+                   ("../configs/sokil-upu.json", 'output/sokil-upu.pdf'),
+                   ("../configs/personal.json", 'output/personal.pdf')])
+    elif '--keys' in sys.argv:
+        # The songbook, and variants of it for beginners (in the easiest keys) and for playing with a capo
+        build_all([("../configs/lsh-spivanyk.json", 'output/2024-01-lsh.pdf'),
+                   ("../configs/lsh-spivanyk.json", 'output/2024-01-lsh-easy.pdf', {"TRANSPOSE": "easiest"}),
+                   ("../configs/lsh-spivanyk.json", 'output/2024-01-lsh-capo-2.pdf', {"TRANSPOSE": -2})])
+    else:
+        main("../configs/lsh-spivanyk.json", 'output/2024-01-lsh.pdf')
@@ -0,0 +1,55 @@
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from consts import Config, Font
+
+
+"""
+Measures strings using the glyph advance widths of the fonts registered on a PDF.
+The advance table of each font is pulled out once, and every measured width is kept in an LRU cache,
+so measuring the same chord or lyric again (eg. on another layout pass) is a single lookup.
+"""
+class FontMetrics:
+    def __init__(self, fonts: Dict[str, Dict], k: float, cache_size: int = Config.STRING_WIDTH_CACHE_SIZE):
+        """
+        @param fonts: The fonts registered on the PDF (font key -> FPDF font dict)
+        @param k: The scale factor of the PDF's unit
+        @param cache_size: How many measured widths we keep
+        """
+        self.fonts = fonts
+        self.k = k
+        # font key -> (glyph advances, width of missing glyphs)
+        self._advances: Dict[str, Tuple[Sequence, int]] = {}
+        self.string_width = lru_cache(maxsize=cache_size)(self._string_width)
+
+    @staticmethod
+    def font_key(font: Font) -> str:
+        """ The key a Font is registered under (underlining is drawn, it's not a separate font) """
+        style = font["style"].upper().replace('U', '')
+        return font["family"].lower() + ('BI' if style == 'IB' else style)
+
+    def advances(self, font_key: str) -> Tuple[Sequence, int]:
+        """ Returns the glyph advance widths of the given font (in 1/1000 of the font size), and the missing width """
+        if font_key not in self._advances:
+            font = self.fonts[font_key]
+            missing_width = font.get('desc', {}).get('MissingWidth') or 500
+            self._advances[font_key] = (font['cw'], missing_width)
+        return self._advances[font_key]
+
+    def _string_width(self, font_key: str, size: float, string: str) -> float:
+        """ Measures a string the same way FPDF.get_string_width does, in the given font & size (in points) """
+        cw, missing_width = self.advances(font_key)
+        w = 0
+        if self.fonts[font_key]['type'] == 'TTF':
+            num_glyphs = len(cw)
+            for char in string:
+                char = ord(char)
+                w += cw[char] if num_glyphs > char else missing_width
+        else:
+            for char in string:
+                w += cw.get(char, 0)
+        return w * (size / self.k) / 1000.0
+
+    def string_widths(self, font_key: str, size: float, strings: List[str]) -> List[float]:
+        """ Measures every given string (eg. all the segments of a line) in the given font & size """
+        return [self.string_width(font_key, size, string) for string in strings]
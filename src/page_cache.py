@@ -0,0 +1,101 @@
+import hashlib
+import os
+import pickle
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from consts import Config
+from song.song import Song
+
+
+class PageRecord(NamedTuple):
+    """ Everything a page of songs added to the PDF, so it can be added again without rendering the songs """
+    content: str  # The content the songs added to the page
+    state: Tuple  # The graphics state (font, colors, position) the songs left the PDF in
+    subsets: Dict[str, List[int]]  # The characters the songs used, per font (for every font they selected)
+    diagrams: List[Tuple[str, int, Tuple[int, ...]]]  # The chord diagrams placed (see PDF.chord_template)
+
+
+"""
+A cache of the pages of songs rendered by previous builds, saved as a single file.
+A page is keyed on the songs on it (their content hashes), the graphics state it starts in, and every Config value;
+the page number isn't part of the key, so unchanged pages are reused even if an edit earlier in the book moved them.
+"""
+class PageCache:
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'pages.pickle')
+    # Bump this whenever rendering changes, so that pages rendered by an older version aren't reused
+    RENDER_VERSION: int = 5
+
+    _instance: Optional['PageCache'] = None
+
+    def __init__(self, cache_file: str = CACHE_FILE):
+        self.cache_file = cache_file
+        # page key -> page
+        self.pages: Dict[Tuple, PageRecord] = {}
+        # The pages used by this build; only these are saved
+        self.used: Set[Tuple] = set()
+        self.dirty = False
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'PageCache':
+        """ Returns the shared cache, loading it on first use """
+        if cls._instance is None:
+            cls._instance = PageCache()
+        return cls._instance
+
+    @classmethod
+    def fingerprint(cls) -> str:
+        """ A hash of every Config value (any of them could change how a page is rendered) """
+        values = [cls.RENDER_VERSION] + sorted((name, repr(value)) for name, value in vars(Config).items()
+                                               if name.isupper())
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key(fingerprint: str, songs: List[Song], state: Tuple) -> Tuple:
+        """ The key of a page with the given songs on it, starting in the given graphics state """
+        return fingerprint, tuple((song.title, song.content_hash) for song in songs), state
+
+    def page(self, key: Tuple) -> Optional[PageRecord]:
+        page = self.pages.get(key)
+        if page is not None:
+            self.used.add(key)
+        return page
+
+    def add(self, key: Tuple, page: PageRecord) -> None:
+        self.pages[key] = page
+        self.used.add(key)
+        self.dirty = True
+
+    def used_pages(self) -> Dict[Tuple, PageRecord]:
+        """ The pages used by this build (so far) """
+        return {key: self.pages[key] for key in self.used}
+
+    def merge(self, pages: Dict[Tuple, PageRecord]) -> None:
+        """ Adds the pages used by another build (eg. in another process), so they're kept too """
+        if pages.keys() - self.pages.keys():
+            self.dirty = True
+        self.pages.update(pages)
+        self.used.update(pages)
+
+    def save(self) -> None:
+        """ Saves the pages used by this build, dropping the rest """
+        if not self.dirty and self.used == set(self.pages):
+            return
+
+        pages = self.used_pages()
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump((self.RENDER_VERSION, pages), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'rb') as f:
+                version, pages = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            return
+
+        if version == self.RENDER_VERSION:
+            self.pages = pages
@@ -0,0 +1,119 @@
+from typing import List, Optional, Tuple
+
+from consts import Config
+from layout import SongLayout
+
+
+"""
+Plans the page breaks of a whole section at once, rather than breaking the page whenever the next song doesn't fit.
+Sorted sections keep their order; the breaks are chosen by dynamic programming (as Knuth & Plass break paragraphs
+into lines), minimizing the number of pages first, and then how unevenly the pages are filled.
+In unsorted sections, each page is instead packed from the next few songs (see PAGE_REORDER_WINDOW).
+"""
+class Paginator:
+    def __init__(self, reorder_window: int = None):
+        """
+        @param reorder_window: How many songs ahead we look for songs to fill a page with, in unsorted sections
+        """
+        self.reorder_window = Config.PAGE_REORDER_WINDOW if reorder_window is None else reorder_window
+        self.usable_height = Config.PDF_HEIGHT - Config.PDF_MARGIN_TOP - Config.PDF_MARGIN_BOTTOM
+
+    def plan(self, layouts: List[SongLayout], reorder: bool) -> List[List[int]]:
+        """
+        Plans the pages of a section
+        @param layouts: The layouts of the songs in the section, in order
+        @param reorder: Whether songs may be moved (within the reorder window) to fill the pages better
+        @return: The indexes of the songs on each page, in the order they're rendered
+        """
+        heights = [layout.meta_height + layout.lyrics['h'] for layout in layouts]
+        # Songs which span multiple pages always get pages of their own
+        spans = [layout.pages for layout in layouts]
+
+        if reorder and self.reorder_window > 1:
+            return self._pack(heights, spans)
+        return self._break(heights, spans)
+
+    def _slack(self, heights: List[float]) -> Optional[float]:
+        """ Returns the space left at the bottom of a page with the given songs on it, or None if they don't fit """
+        # The same steps as PDF.render_songs takes, so we agree on what fits
+        y = Config.PDF_MARGIN_TOP
+        for i, height in enumerate(heights):
+            if i > 0:
+                y = y + Config.SONG_MARGIN
+            if height > (Config.PDF_HEIGHT - (y + Config.PDF_MARGIN_BOTTOM)):
+                return None
+            y = y + height
+        return Config.PDF_HEIGHT - Config.PDF_MARGIN_BOTTOM - y
+
+    def _badness(self, slack: float) -> float:
+        """ How badly filled a page with this much space left is """
+        return (slack / self.usable_height) ** 2
+
+    def _break(self, heights: List[float], spans: List[int]) -> List[List[int]]:
+        """ Chooses the page breaks which keep the songs in order """
+        num_songs = len(heights)
+        # best[i] = (pages, badness, start of the last page) for the first i songs
+        best: List[Tuple[int, float, int]] = [(0, 0, 0)] + [None] * num_songs
+
+        for i in range(1, num_songs + 1):
+            if spans[i - 1] > 1:
+                best[i] = (best[i - 1][0] + spans[i - 1], best[i - 1][1], i - 1)
+                continue
+
+            # Try every page ending with song i - 1, adding songs until they no longer fit
+            for j in range(i - 1, -1, -1):
+                if spans[j] > 1:
+                    break
+                slack = self._slack(heights[j:i])
+                if slack is None:
+                    break
+
+                # The last page of a section is allowed to be empty (like the last line of a paragraph)
+                badness = 0 if i == num_songs else self._badness(slack)
+                cost = (best[j][0] + 1, best[j][1] + badness, j)
+                if best[i] is None or cost[:2] < best[i][:2]:
+                    best[i] = cost
+
+            # A song which doesn't fit on a page alone still gets one
+            if best[i] is None:
+                best[i] = (best[i - 1][0] + 1, best[i - 1][1], i - 1)
+
+        pages = []
+        i = num_songs
+        while i > 0:
+            pages.append(list(range(best[i][2], i)))
+            i = best[i][2]
+
+        return pages[::-1]
+
+    def _pack(self, heights: List[float], spans: List[int]) -> List[List[int]]:
+        """ Packs each page as full as possible from the next few songs, keeping their relative order on the page """
+        remaining = list(range(len(heights)))
+        pages = []
+
+        while remaining:
+            # The first song left always starts the next page, so no song is pushed back indefinitely
+            first = remaining[0]
+            page = [first]
+            if spans[first] == 1:
+                candidates = [i for i in remaining[1:self.reorder_window] if spans[i] == 1]
+                page = self._fill(heights, [first], candidates)[1]
+
+            pages.append(page)
+            remaining = [i for i in remaining if i not in page]
+
+        return pages
+
+    def _fill(self, heights: List[float], page: List[int], candidates: List[int]) -> Tuple[float, List[int]]:
+        """ Finds the candidates which, added to the page, leave the least space; prefers the earliest songs """
+        slack = self._slack([heights[i] for i in page])
+        if slack is None:
+            return None, page
+        best = (slack, page)
+
+        for n, candidate in enumerate(candidates):
+            option = self._fill(heights, page + [candidate], candidates[n + 1:])
+            if option[0] is not None and option[0] < best[0]:
+                best = option
+
+        return best
@@ -1,58 +1,89 @@
+import hashlib
 import os
-import re
-from typing import List, Dict, Tuple, Optional, Set
+import zlib
+from typing import Callable, List, Dict, NamedTuple, Tuple, Optional, Set
 
 from fpdf import FPDF
-from pyuca import Collator
 from tqdm import tqdm
 
-from consts import Config, Font
+from chords import ChordDictionary, ChordShape
+from collation import Collation
+from consts import BuildConfig, Config, Font
+from fonts import FontCache
+from layout import SongLayout, SongMeasurer
+from layout_cache import LayoutCache
+from page_cache import PageCache, PageRecord
+from pagination import Paginator
+from metrics import FontMetrics
+from song.chordpro import Directive, LyricLine
 from song.song import Song
-
-FONTS_DIR: str = os.path.normpath(os.path.join(Config.ROOT_DIR, 'assets/fonts'))
+from utils import Utils
+from voicings import Voicings
 
 
 
 class PDF(FPDF):
     def __init__(self):
+        # Every font selected (see set_font), in order; only these are embedded
+        self.selected_fonts: List[str] = []
+        # Every chord diagram placed (see place_chord), in order; a page replayed elsewhere needs them drawn there too
+        self.placed_diagrams: List[Tuple[str, int, Tuple[int, ...]]] = []
         # Create the FPDF instance and configure it
         super().__init__(orientation="portrait", unit=Config.PDF_UNIT, format=(Config.PDF_WIDTH, Config.PDF_HEIGHT))
         self.set_margins(Config.PDF_MARGIN_LEFT, Config.PDF_MARGIN_TOP, Config.PDF_MARGIN_RIGHT)
         self.set_auto_page_break(auto=True, margin=Config.PDF_MARGIN_BOTTOM)
         self.add_page()
+        # Every section starts from this state, so that it renders the same no matter what came before it
+        self.initial_state = self._graphics_state()
+
+        # Add the fonts the config uses (parsing a font is slow, so their metrics are cached - see FontCache)
+        for family, style, ttffile in FontCache.font_files(FontCache.families()):
+            self.add_cached_font(family, style, ttffile)
 
-        # Add all the fonts we'll be using
-        self.add_font(family="Poiret One", fname=os.path.join(FONTS_DIR, 'poiret_one.ttf'), uni=True)
-        self.add_font(family="Caveat", fname=os.path.join(FONTS_DIR, 'caveat.ttf'), uni=True)
-        self.add_font(family="Open Sans", fname=os.path.join(FONTS_DIR, 'open_sans.ttf'), uni=True)
-        self.add_font(family="Open Sans", style='B', fname=os.path.join(FONTS_DIR, 'open_sans_bold.ttf'), uni=True)
-        self.add_font(family="Open Sans", style='I', fname=os.path.join(FONTS_DIR, 'open_sans_italic.ttf'), uni=True)
-        self.add_font(family="Futura Futuris C", fname=os.path.join(FONTS_DIR, 'futura_futuris_c.ttf'), uni=True)
-        self.add_font(family="Futura Futuris C", style='B', fname=os.path.join(FONTS_DIR, 'futura_futuris_c_bold.ttf'), uni=True)
-        self.add_font(family="Futura Futuris C", style='I', fname=os.path.join(FONTS_DIR, 'futura_futuris_c_italic.ttf'), uni=True)
-        self.add_font(family="Futura Futuris C Light", fname=os.path.join(FONTS_DIR, 'futura_futuris_c_light.ttf'), uni=True)
-        self.add_font(family="Ubuntu", fname=os.path.join(FONTS_DIR, 'ubuntu.ttf'), uni=True)
-        self.add_font(family="Ubuntu", style='I', fname=os.path.join(FONTS_DIR, 'ubuntu_italic.ttf'), uni=True)
-        self.add_font(family="Ubuntu", style='B', fname=os.path.join(FONTS_DIR, 'ubuntu_bold.ttf'), uni=True)
-        self.add_font(family="Ubuntu Light", fname=os.path.join(FONTS_DIR, 'ubuntu_light.ttf'), uni=True)
-        self.add_font(family="Ubuntu Light", style="B", fname=os.path.join(FONTS_DIR, 'ubuntu.ttf'), uni=True)
+        # All the strings we measure go through the (cached) glyph advance tables of these fonts
+        self.metrics = FontMetrics(self.fonts, self.k)
+        # Songs are measured from these metrics, instead of being rendered twice
+        self.measurer = SongMeasurer(self, self.metrics)
+        # Pages of songs are reused from earlier builds if nothing about them changed
+        self.page_fingerprint = PageCache.fingerprint()
 
         # Some basic config variables
-        self.index_number_width = None
-        self.index_text_width = None
+        self.index_column_width = None
         self.index_text_height = None
+        # Everything we drew once to be placed many times (eg. chord diagrams), as form XObjects (see template)
+        self.templates: Dict[Tuple, Dict[str, any]] = {}
 
-    def get_index_number_width(self) -> float:
-        if not self.index_number_width:
-            self.index_number_width = self.get_string_width("1234567")
+    def add_cached_font(self, family: str, style: str, ttffile: str) -> None:
+        """ Adds a TrueType font, as FPDF.add_font does - but with the metrics from the FontCache """
+        fontkey = family.lower() + style
+        if fontkey in self.fonts:
+            return
 
-        return self.index_number_width
+        # Fonts which share a file (eg. Ubuntu, and Ubuntu Light bold) are the same font to the PDF, so that the
+        #   file is only embedded once - subset to the characters used in either
+        for other in self.fonts.values():
+            if other['ttffile'] == ttffile:
+                self.fonts[fontkey] = other
+                other['names'].append(f"{family} {style}".strip())
+                return
+
+        font = FontCache.get().font(ttffile)
+        self.fonts[fontkey] = {
+            'i': len({other['i'] for other in self.fonts.values()}) + 1, 'type': font['type'], 'name': font['name'], 'desc': font['desc'],
+            'up': font['up'], 'ut': font['ut'], 'cw': font['cw'], 'ttffile': ttffile, 'fontkey': fontkey,
+            'subset': list(range(0, 32)), 'unifilename': font['unifilename'],
+            # The fonts (family & style) using this file
+            'names': [f"{family} {style}".strip()],
+        }
+        self.font_files[fontkey] = {'length1': font['originalsize'], 'type': "TTF", 'ttffile': ttffile}
+        self.font_files[ttffile] = {'type': "TTF"}
 
-    def get_index_text_width(self) -> float:
-        if not self.index_text_width:
-            self.index_text_width = Config.USABLE_PAGE_WIDTH - self.get_index_number_width()
+    def get_index_column_width(self) -> float:
+        if not self.index_column_width:
+            columns = Config.INDEX_COLUMNS
+            self.index_column_width = (Config.USABLE_PAGE_WIDTH - Config.INDEX_COLUMN_MARGIN * (columns - 1)) / columns
 
-        return self.index_text_width
+        return self.index_column_width
 
     def get_index_text_height(self) -> float:
         if not self.index_text_height:
@@ -60,6 +91,27 @@ class PDF(FPDF):
 
         return self.index_text_height
 
+    def get_string_width(self, s: str) -> float:
+        """ Get the width of a string in the current font """
+        return self.metrics.string_width(self.font_family + self.font_style, self.font_size_pt, s)
+
+    def get_string_widths(self, strings: List[str], font: Optional[Font] = None) -> List[float]:
+        """
+        Get the widths of all the given strings at once
+        @param strings: The strings to measure
+        @param font: The font to measure them in (the current font by default)
+        """
+        if font is None:
+            return self.metrics.string_widths(self.font_family + self.font_style, self.font_size_pt, strings)
+        return self.metrics.string_widths(FontMetrics.font_key(font), font["size"], strings)
+
+    def set_font(self, family, style='', size=0):
+        super().set_font(family, style, size)
+        # (listed once per change of font, rather than once per call)
+        font_key = self.font_family + self.font_style
+        if not self.selected_fonts or self.selected_fonts[-1] != font_key:
+            self.selected_fonts.append(font_key)
+
     def footer(self):
         self.set_y(-20)
         self.set_font(Config.BODY_FONT["family"], '', Config.BODY_FONT["size"])
@@ -85,124 +137,52 @@ class PDF(FPDF):
             self.set_text_color(*color)
         self.set_font(family=font["family"], style=font["style"], size=font["size"])
 
-    def render_meta(self, lines: List[str], dry_run=False) -> float:
+    def render_meta(self, directives: List[Directive]) -> float:
         """
-        Renders the given metadata information (contained in lines) on the given PDF item
-        @param dry_run: If we should actually render the meta, or return the total height of these blocks
-        @param lines: A list containing the metadata lines
+        Renders the given metadata information (contained in directives) on the given PDF item
+        @param directives: A list containing the metadata directives
+        @return: The total height of these blocks
         """
-        # If this is a dry run, we use a temporary PDF object
-        if dry_run:
-            pdf = TEMP_PDF
-            pdf.add_page()
-        else:
-            pdf = self
-
-        start_y = pdf.get_y()
+        start_y = self.get_y()
 
-        for line in lines:
-            line = line.strip()
+        for directive in directives:
             # Check if it's a title
-            if Config.RE_TITLE.match(line):
-                line = Config.RE_TITLE.match(line).group('args')
-                pdf.render_line(line, Config.TITLE_FONT)
+            if directive.command == 'title':
+                self.render_line(directive.args, Config.TITLE_FONT)
             # Check if it's an alternate title
-            elif Config.RE_ALT_TITLE.match(line):
+            elif directive.command == 'alt_title':
                 pass
-                # line = "(" + Config.RE_ALT_TITLE.match(line).group('args') + ")"
-                # pdf.render_line(line, Config.ALT_TITLE_FONT)
+                # line = "(" + directive.args + ")"
+                # self.render_line(line, Config.ALT_TITLE_FONT)
             # Check if this is an subtitle
-            elif Config.RE_SUBTITLE.match(line):
-                line = Config.RE_SUBTITLE.match(line).group('args')
-                pdf.render_line(line, Config.SUBTITLE_FONT)
+            elif directive.command == 'subtitle':
+                self.render_line(directive.args, Config.SUBTITLE_FONT)
             # Catch-all
             else:
-                print(f"Matched an unsupported command, skipping: {line}")
+                print(f"Matched an unsupported command, skipping: {directive}")
 
 
-        return pdf.get_y() - start_y
+        return self.get_y() - start_y
 
 
-    def render_lyrics(self, lines: List[str], dry_run=False) -> Dict[str, float]:
+    def render_lyrics(self, lines: List[LyricLine], layout: SongLayout) -> Dict[str, float]:
         """
         Renders the given lyrics
-        @param dry_run: If we should actually render the lyrics, or return the total height of these blocks
         @param lines: A list of lyrics to render
+        @param layout: The measurements of the song these lyrics belong to
         """
-        # If this is a dry run, we use a temporary PDF object
-        if dry_run:
-            pdf = TEMP_PDF
-            pdf.add_page()
-        else:
-            pdf = self
-
         # Set the default body font
-        pdf.set_font_obj(Config.BODY_FONT)
-
-        two_cols = self._split_song(lines)
+        self.set_font_obj(Config.BODY_FONT)
 
-        if two_cols:
-            col1, col2 = two_cols
-            margin = pdf._two_col_margin(col1, col2)
+        if layout.columns:
+            margin = self.measurer.column_margin(layout.columns[0], layout.columns[1], self.get_y())
             if margin > 0:
-                return pdf._render_lyrics_two_col(col1, col2, margin)
+                return self._render_lyrics_two_col(lines[:layout.split], lines[layout.split+1:], margin)
 
         # Otherwise, we stick with the default render method
-        return pdf._render_lyrics_one_col(lines)
-
-    @staticmethod
-    def _split_song(lines: List[str]) -> Optional[Tuple[List[str], List[str]]]:
-        """
-        Splits a given song into two columns (if possible)
-        @param lines: The lines of the song
-        @return: Two lists representing the two columns, or None if a break is not possible
-        """
-        # First - find the indexes of every linebreak in the song
-        breaks = [i for i, v in enumerate(lines) if not v.strip()]
-
-        if len(breaks) == 0:
-            return
-
-        # Then, find the most suitable break to split the song in two
-        middle_break = min(breaks, key=lambda x: abs(x - 1 - len(lines) // 2))
-
-        # Split the lyrics into the two columns
-        return lines[:middle_break], lines[middle_break+1:]
-
-    def _two_col_margin(self, col1: List[str], col2: List[str]):
-        """
-        Calculates the horizontal margin between the two columns
-        @param col1: The first column
-        @param col2: The second column
-        @return: The horizontal margin, or -1 if the two columns do not fit all the requirements (eg. are shorter than
-            the minimum height, are too wide, etc).
-        """
-        # Calculate the dimensions of both columns
-        start_y = self.get_y()
-        TEMP_PDF.add_page()
-        col1_dims = TEMP_PDF._render_lyrics_one_col(col1)
-        TEMP_PDF.add_page()
-        col2_dims = TEMP_PDF._render_lyrics_one_col(col2)
-        self.set_y(start_y)
-
-        # Check how much space we would have left if we rendered in two cols
-        space_left = Config.USABLE_PAGE_WIDTH - (col1_dims['w'] + col2_dims['w'])
-        enough_space_left = space_left >= Config.MIN_COLUMN_MARGIN
-
-        # Check if both columns are at least the minimum height
-        cols_match_min_height = (col1_dims['h'] > Config.MIN_SONG_HEIGHT and col2_dims['h'] > Config.MIN_SONG_HEIGHT)
-
-        # Check if this song will fit onto the page
-        total_height = self.get_y() + max(col1_dims['h'], col2_dims['h']) + Config.PDF_MARGIN_BOTTOM
-        song_fits_height = total_height <= Config.PDF_HEIGHT
-
-        if enough_space_left and cols_match_min_height and song_fits_height:
-            return min(space_left, Config.MAX_COLUMN_MARGIN)
+        return self._render_lyrics_one_col(lines)
 
-        return -1
-
-
-    def _render_lyrics_two_col(self, col1: List[str], col2: List[str], margin_size) -> Dict[str, float]:
+    def _render_lyrics_two_col(self, col1: List[LyricLine], col2: List[LyricLine], margin_size) -> Dict[str, float]:
         """
         Render a song lyrics in two columns
         @param margin_size: The margin size between the two columns
@@ -234,7 +214,7 @@ class PDF(FPDF):
             'w': col1_dims['w'] + col2_dims['w']
         }
 
-    def _render_lyrics_one_col(self, lines: List[str], start_x=Config.PDF_MARGIN_LEFT) -> Dict[str, float]:
+    def _render_lyrics_one_col(self, lines: List[LyricLine], start_x=Config.PDF_MARGIN_LEFT) -> Dict[str, float]:
         """
         Renders the given lyrics in a single column
         @param lines: A list of lines to render
@@ -247,60 +227,56 @@ class PDF(FPDF):
         for line in lines:
             # Reset the X-coordinate for each line
             self.set_x(start_x)
-            # Check if this line is indented, then strip all whitespace
-            indented = line.startswith('\t')
-            line = line.strip()
 
-            if indented:
+            if line.indented:
                 self.set_x(start_x + Config.PDF_INDENT)
 
             # Check if this line is bolded
-            if Config.RE_BOLD.match(line):
+            if line.bold:
                 self.set_font(family=Config.BODY_FONT["family"], style='UI', size=Config.BODY_FONT["size"])
-                line = Config.RE_BOLD.match(line).group(1)
             else:
                 self.set_font_obj(Config.BODY_FONT)
 
             # Check if this is a line with chords
-            if Config.RE_LYRICS_CHORDS.match(line):
+            if line.chords:
                 # This is the minimum X we can write on
                 # This prevents us from writing chords on top of each other
                 min_x = self.get_x()
-                line_words = []
-                for line_segment in re.split("(\\[.*?])", line):
-                    # If this is a chord, we print it
-                    if Config.RE_LYRICS_CHORDS.match(line_segment):
-                        # Strip the brackets from the chord
-                        chord = line_segment[1:-1]
-                        # Calculate the width of the chord
-                        width = self.get_string_width(chord)
-                        # Set the chord font
-                        self.set_font_obj(Config.CHORD_FONT, Config.CHORD_FONT["color"])
-                        # Make sure we don't write over other chords
-                        self.set_x(max(self.get_x(), min_x))
-                        self.cell(w=width, h=Config.CHORD_FONT["size"], txt=chord)
-                        # Update the min_x and max_x
-                        min_x = self.get_x() + self.get_string_width(" ")  # The MINIMUM X-coordinate we can write on
-                        max_x = max(self.get_x(), max_x)  # The MAXIMUM X-coordinate we have reached so far
-                        self.set_x(self.get_x() - width)
-                        self.set_font_obj(Config.BODY_FONT, Config.BODY_FONT["color"])
-                    else:
-                        line_words.append(line_segment)
-                        self.set_x(self.get_x() + self.get_string_width(line_segment))
+                segments = line.segments()
+                # Measure all the segments at once. The first is in the line's font; each chord resets the body font
+                segment_widths = (self.get_string_widths([segments[0][0]]) +
+                                  self.get_string_widths([s for s, _ in segments[1:]], Config.BODY_FONT))
+                for (line_segment, chord), segment_width in zip(segments, segment_widths):
+                    self.set_x(self.get_x() + segment_width)
+                    # If there's a chord after this segment, we print it
+                    if chord is None:
+                        continue
+
+                    # Calculate the width of the chord
+                    width = self.get_string_width(chord)
+                    # Set the chord font
+                    self.set_font_obj(Config.CHORD_FONT, Config.CHORD_FONT["color"])
+                    # Make sure we don't write over other chords
+                    self.set_x(max(self.get_x(), min_x))
+                    self.cell(w=width, h=Config.CHORD_FONT["size"], txt=chord)
+                    # Update the min_x and max_x
+                    min_x = self.get_x() + self.get_string_width(" ")  # The MINIMUM X-coordinate we can write on
+                    max_x = max(self.get_x(), max_x)  # The MAXIMUM X-coordinate we have reached so far
+                    self.set_x(self.get_x() - width)
+                    self.set_font_obj(Config.BODY_FONT, Config.BODY_FONT["color"])
 
                 # Linebreak
                 self.ln()
                 self.set_y(self.get_y() + Config.LINE_HEIGHT)
-                line = ''.join(line_words)
 
             # Reset the X position (in case of chords)
-            self.set_x(start_x + (Config.PDF_INDENT if indented else 0))
+            self.set_x(start_x + (Config.PDF_INDENT if line.indented else 0))
             # Update the max X position
-            max_x = max(self.get_string_width(line) + self.get_x(), max_x)
+            max_x = max(self.get_string_width(line.text) + self.get_x(), max_x)
             # If we have an empty line, the width is 0 - which means unlimited. Instead, we want a small width
-            string_width = max(self.get_string_width(line), 0.1)
+            string_width = max(self.get_string_width(line.text), 0.1)
             # Print the line (or the line minus the chords)
-            self.cell(w=string_width, h=Config.BODY_FONT["size"], ln=1, txt=line)
+            self.cell(w=string_width, h=Config.BODY_FONT["size"], ln=1, txt=line.text)
             self.set_y(self.get_y() + Config.LINE_HEIGHT)
 
         return {
@@ -308,42 +284,163 @@ class PDF(FPDF):
             'w': max_x - start_x,
         }
 
-    def render_song(self, song: Song) -> Optional[Tuple[str, List[str], int]]:
+    def render_song(self, song: Song, last_on_page=True) -> Optional[Tuple[str, List[str], int]]:
         """
         Renders the given Song object on the given PDF object
         @param song: The Song object which we render
+        @param last_on_page: Whether this is the last song on its page (ie. it may be spread down the page)
         @return: The title of this song, the alternate titles, and the page number on which this song starts
         """
-        try:
-            meta_height = self.render_meta(song.meta, True)
-            lyric_dims = self.render_lyrics(song.lyrics, True)
-        except EOFError:
-            print(f"Song {song.title} is too long to render")
-            return None
+        # Measure the song first (unless it's unchanged since it was last measured), so we know where on the page it goes
+        diagrams = self.song_diagrams(song)
+        layout = LayoutCache.get().layout(song, self.measurer, len(diagrams))
 
-        song_height = meta_height + lyric_dims['h']
+        song_height = layout.meta_height + layout.lyrics['h']
         # Check if this song can be rendered on the current page - if not, add another
-        if song_height > (Config.PDF_HEIGHT - (self.get_y() + Config.PDF_MARGIN_BOTTOM)):
+        #   (unless we're already at the top of one; a song longer than a page has to split either way)
+        fits = song_height <= (Config.PDF_HEIGHT - (self.get_y() + Config.PDF_MARGIN_BOTTOM))
+        if not fits and self.get_y() != Config.PDF_MARGIN_TOP:
             self.add_page()
 
         # Here, we calculate if there would be enough room at the bottom of the page to render an image.
         #   If not - we spread the songs out instead
         free_space = Config.PDF_HEIGHT - (self.get_y() + song_height) - Config.PDF_MARGIN_BOTTOM
-        # If we don't have enough space, AND this song isn't the first on the page
-        if free_space <= Config.MIN_IMAGE_HEIGHT and self.get_y() != Config.PDF_MARGIN_TOP:
+        # If we don't have enough space, AND this song isn't the first on the page (nor followed by another)
+        if free_space <= Config.MIN_IMAGE_HEIGHT and self.get_y() != Config.PDF_MARGIN_TOP and last_on_page:
             # Bump the song down to the bottom
             page_bottom = Config.PDF_HEIGHT - Config.PDF_MARGIN_BOTTOM - (free_space / 2)
             self.set_y(page_bottom - song_height)
 
         page_no = self.page_no()
         self.render_meta(song.meta)  # Render the metadata of this song
-        self.render_lyrics(song.lyrics)  # Render the lyrics of this song
+        self.render_song_diagrams(diagrams)  # Render the diagrams of the chords in this song (if we show them)
+        self.render_lyrics(song.lyrics, layout)  # Render the lyrics of this song
 
         if self.page_no() != page_no:
             print(f"Song {song.title} splits multiple pages")
 
         return page_no
 
+    def render_page(self, songs: List[Song], planned: bool) -> List[int]:
+        """
+        Renders the songs planned for a page, one after the other. If the same songs were rendered on a page
+        starting in the same state in an earlier build, that page's content is reused instead
+        @param songs: The songs on this page
+        @param planned: Whether the songs were planned to fit onto this page (if not, they break the page as needed)
+        @return: The page number of each song
+        """
+        key = PageCache.key(self.page_fingerprint, songs, self._graphics_state()) if planned else None
+        cached = PageCache.get().page(key) if planned else None
+        if cached is not None:
+            self._replay_page(cached)
+            return [self.page_no()] * len(songs)
+
+        start_page = self.page
+        start_length = len(self.pages[self.page])
+        start = self._record_start()
+
+        page_numbers = []
+        for i, song in enumerate(songs):
+            if i > 0:
+                self.set_y(self.get_y() + Config.SONG_MARGIN)
+            page_numbers.append(self.render_song(song, last_on_page=not planned or i == len(songs) - 1))
+
+        # Only songs which stayed on a single page can be replayed
+        if planned and self.page == start_page:
+            PageCache.get().add(key, self._page_record(start_length, start))
+
+        return page_numbers
+
+    def _record_start(self) -> Tuple[Dict[str, int], int, int]:
+        """ The point (in each font's subset, the fonts selected & the diagrams placed) a PageRecord starts from """
+        return ({font_key: len(font['subset']) for font_key, font in self.fonts.items() if 'subset' in font},
+                len(self.selected_fonts), len(self.placed_diagrams))
+
+    def _page_record(self, content_start: int, start: Tuple[Dict[str, int], int, int]) -> PageRecord:
+        """
+        Everything added to the current page since the given point, as a PageRecord
+        @param content_start: The length of the page's content at that point
+        @param start: The point the record starts from (see _record_start)
+        """
+        subset_start, selected_start, diagrams_start = start
+        # The characters written in each font - for every font written in, or selected
+        selected = set(self.selected_fonts[selected_start:])
+        subsets = {font_key: list(dict.fromkeys(self.fonts[font_key]['subset'][length:]))
+                   for font_key, length in subset_start.items()}
+        return PageRecord(self.pages[self.page][content_start:], self._graphics_state(),
+                          {font_key: subset for font_key, subset in subsets.items() if subset or font_key in selected},
+                          list(dict.fromkeys(self.placed_diagrams[diagrams_start:])))
+
+    def _offset(self) -> int:
+        """ The offset (in the output) the next line we write goes to """
+        return len(self.buffer)
+
+    def _embedded_fonts(self) -> Dict[str, Dict[str, any]]:
+        """ The fonts to embed: every font selected or written in, once (see add_cached_font) """
+        used = set(self.selected_fonts) | {font_key for font_key, font in self.fonts.items()
+                                           if any(char >= 32 for char in font.get('subset', ()))}
+        return {font['fontkey']: font for font_key, font in self.fonts.items() if font_key in used}
+
+    def _putfonts(self):
+        # Every font once, with the characters it used listed once each
+        fonts = self.fonts
+        self.fonts = self._embedded_fonts()
+        for font in self.fonts.values():
+            if 'subset' in font:
+                font['subset'] = sorted(set(font['subset']))
+
+        start = self._offset()
+        super()._putfonts()
+
+        self.font_report(start)
+        self.fonts = fonts
+
+    def font_report(self, start: int) -> None:
+        """ Prints how many bytes each embedded font takes up in the output, and which fonts are using it """
+        fonts = sorted(self.fonts.values(), key=lambda font: font['n'])
+        ends = [self.offsets[font['n']] for font in fonts[1:]] + [self._offset()]
+
+        print("Embedded fonts:")
+        for font, end in zip(fonts, ends):
+            # (the first 32 characters are always included)
+            characters = sum(1 for char in font['subset'] if char >= 32)
+            print(f"  {os.path.basename(font['ttffile'])} ({', '.join(font['names'])}): {characters} characters, "
+                  f"{(end - self.offsets[font['n']]) / 1024:.1f} KB")
+        print(f"  Total: {(self._offset() - start) / 1024:.1f} KB")
+
+    def _putresourcedict(self):
+        # Fonts which share a file are the same font, which we only list once (and fonts we never used, not at all)
+        fonts = self.fonts
+        self.fonts = self._embedded_fonts()
+        super()._putresourcedict()
+        self.fonts = fonts
+
+    def _replay_page(self, page: PageRecord) -> None:
+        """ Adds the content of a page rendered earlier (or elsewhere) to the current page """
+        self.pages[self.page] += page.content
+        self._restore_graphics_state(page.state)
+        for font_key, subset in page.subsets.items():
+            self.fonts[font_key]['subset'].extend(subset)
+        # The fonts the page selected are used here too
+        self.selected_fonts.extend(page.subsets)
+        # As are its chord diagrams, which may not have been drawn in this PDF yet
+        for name, base, frets in page.diagrams:
+            self.chord_template(name, base, frets)
+        self.placed_diagrams.extend(page.diagrams)
+
+    def _graphics_state(self) -> Tuple:
+        """ Everything which affects what FPDF writes next (besides the page number) """
+        return (self.font_family, self.font_style, self.underline, self.font_size_pt, self.text_color, self.draw_color,
+                self.fill_color, self.color_flag, self.line_width, self.x, self.y, self.lasth, self.ws)
+
+    def _restore_graphics_state(self, state: Tuple) -> None:
+        (self.font_family, self.font_style, self.underline, self.font_size_pt, self.text_color, self.draw_color,
+         self.fill_color, self.color_flag, self.line_width, self.x, self.y, self.lasth, self.ws) = state
+        self.font_size = self.font_size_pt / self.k
+        if self.font_family:
+            self.current_font = self.fonts[self.font_family + self.font_style]
+            self.unifontsubset = self.current_font['type'] == 'TTF'
+
     def render_songs(self, songs: List[Song], sort_by_name) -> Tuple[List[Tuple[str, int]], Set[str]]:
         """
         Renders all of the songs in a section
@@ -353,19 +450,31 @@ class PDF(FPDF):
         """
         song_index_info = []
         chords = set()
-        first = True
-        for song in tqdm(songs):
-            if not first:
-                self.set_y(self.get_y() + Config.SONG_MARGIN)
-            else:
-                first = False
+        self._restore_graphics_state(self.initial_state)
 
-            page_number = self.render_song(song)
+        planned = Config.PAGE_BREAKS == "optimal"
+        if planned:
+            layouts = [LayoutCache.get().layout(song, self.measurer, len(self.song_diagrams(song))) for song in songs]
+            pages = [[songs[i] for i in page] for page in Paginator().plan(layouts, reorder=not sort_by_name)]
+        else:
+            # Every song goes right after the previous one, and the page breaks whenever a song doesn't fit
+            pages = [songs]
 
+        placements = []
+        progress = tqdm(total=len(songs))
+        for n, page in enumerate(pages):
+            if n > 0:
+                self.add_page()
+            placements.extend(zip(page, self.render_page(page, planned)))
+            progress.update(len(page))
+        progress.close()
+
+        for song, page_number in placements:
             song_index_info.append({ "title": song.title, "page": page_number, "categories": song.categories })
             chords.update(song.get_chords())
 
-            if any("#" in chord or "♭" in chord or "b" in chord for chord in song.get_chords()):
+            # (a song we transposed is written in whichever key it ended up in)
+            if not song.transposed and any("#" in chord or "♭" in chord or "b" in chord for chord in song.get_chords()):
                 print(f"{song.title} — complex chords, consider simplifying")
 
 
@@ -380,73 +489,135 @@ class PDF(FPDF):
         self.add_page()
 
         if sort_by_name:
-            return sorted(song_index_info, key=lambda s: Collator().sort_key(s["title"])), chords
+            return sorted(song_index_info, key=lambda s: Collation.get().sort_key(s["title"])), chords
 
         return song_index_info, chords
 
-
-    def _render_index_song(self, song):
+    def render_fragment(self, fragment: 'SectionFragment') -> Tuple[List[Dict[str, any]], Set[str]]:
         """
-        Renders a single entry in the index
+        Adds a section which was rendered on its own (see render_section), starting on the current page
+        @return: The index entries of the section (with the page numbers they ended up on), and its chords
         """
-        # Figure out how much space we need for numbers (if your pages go higher, we've got other issues)
-        text_height = self.get_index_text_height()
-        text_width = self.get_index_text_width()
-
-        start_y = self.get_y()
-        start_x = self.get_x()
-        # Check if this line will go around to the next page
-        if start_y + text_height + Config.PDF_MARGIN_BOTTOM > Config.PDF_HEIGHT:
-            start_y = Config.PDF_MARGIN_TOP
-
-        # Write the song title
-        self.multi_cell(w=text_width, h=text_height, border='B', txt=song["title"])
-        # Link the song title to its page
-        song_link = self.add_link()
-        self.set_link(song_link, page=song["page"])
-        self.link(x=start_x, y=start_y, w=Config.USABLE_PAGE_WIDTH, h=text_height, link=song_link)
+        offset = self.page_no() - 1
+        for n, page in enumerate(fragment.pages):
+            if n > 0:
+                self.add_page()
+            self._replay_page(page)
 
-        end_y = self.get_y()
+        # Add a page between sections
+        self.add_page()
 
-        # Add the categories
-        if song['categories']:
-            category_str = f"[{', '.join(c for c in song['categories'])}]"
-            self.set_xy(start_x, start_y)
-            self.multi_cell(w=text_width, h=text_height, border='B', align='R', txt=category_str)
+        return [dict(song, page=song["page"] + offset) for song in fragment.index], fragment.chords
 
-        
-        # Update the XY, so we write the number next to the title
-        self.set_xy(text_width + Config.PDF_MARGIN_LEFT, start_y)
-        self.multi_cell(w=self.get_index_number_width(), h=end_y - start_y, border='B', align='C', txt=str(song["page"]))
-        # Update the y-coordinate to be the larger of the two
-        self.set_y(max(self.get_y(), end_y))
 
-    def _render_index_section(self, section: Tuple[str, Dict[str, any]]):
+    def text_row(self, y: float, h: float, segments: List[Tuple[float, str, float]]) -> None:
         """
-        Renders a section of the index
-        @param section: A list containing tuples of the song title and the page number
-        @return:
+        Writes several strings on one line, each at its own x-position, as a single text operation
+        @param y: The top of the line
+        @param h: The height of the line (the text is centered in it, as in a cell)
+        @param segments: The x-position, text & width of each string, left to right
         """
-        # Don't start a new section if we don't have much room on this page
-        if self.get_y() + Config.PDF_MARGIN_BOTTOM + 50 > Config.PDF_HEIGHT:
-            self.add_page()
-
-        # Write the section header
-        self.set_font_obj(Config.INDEX_TITLE_FONT)
-        self.ln()
-        self.multi_cell(w=0, h=Config.INDEX_TITLE_FONT["size"], txt=section[0])
-        self.set_font_obj(Config.INDEX_SONG_FONT)
-        self.ln()
-
-        # Write all the songs in the section
-        for song in section[1]:
-            self._render_index_song(song)
+        parts = []
+        end = segments[0][0]
+        for x, text, width in segments:
+            if parts:
+                # Move along to where the next string starts
+                parts.append('%d' % round(-(x - end) * self.k * 1000 / self.font_size_pt))
+            if self.unifontsubset:
+                # Each character only needs noting down once, to subset the font
+                self.current_font['subset'].extend(map(ord, set(text)))
+                parts.append('(' + self._escape(text.encode('utf-16-be').decode('latin1')) + ')')
+            else:
+                parts.append('(' + self._escape(text) + ')')
+            end = x + width
 
+        s = 'BT %.2F %.2F Td [%s] TJ ET' % (segments[0][0] * self.k, (self.h - (y + .5 * h + .3 * self.font_size)) * self.k,
+                                             ' '.join(parts))
+        if self.color_flag:
+            s = 'q ' + self.text_color + ' ' + s + ' Q'
+        self._out(s)
 
-    def render_index(self, sections: List[Tuple[str, List[Tuple[str, int]]]]) -> None:
+    def _measure_index(self, sections: List[Tuple[str, List[Dict[str, any]]]]) -> List[Tuple[str, List['IndexRow']]]:
+        """
+        Measures every entry of the index at once, and breaks the titles which don't fit their column into lines
+        @param sections: The sections of the index (see render_index)
+        @return: The rows of each section
         """
-        Renders the index of this songbook
-        @param sections: The sections of the index - each section has a (name, List[(song_name, song_page_number)])
+        entries = [song for _, songs in sections for song in songs]
+        titles = [song["title"] for song in entries]
+        categories = [f"[{', '.join(song['categories'])}]" if song['categories'] else '' for song in entries]
+        pages = [str(song["page"]) for song in entries]
+        widths = self.get_string_widths(titles + categories + pages + [' '], Config.INDEX_SONG_FONT)
+        space_width = widths[-1]
+        title_widths = widths[:len(entries)]
+        category_widths = widths[len(entries):2 * len(entries)]
+        page_widths = widths[2 * len(entries):3 * len(entries)]
+
+        # The page numbers are right-aligned, after the titles
+        number_width = max(page_widths, default=0) + space_width * 2
+        column_width = self.get_index_column_width() - self.c_margin * 2
+        line_height = self.get_index_text_height()
+
+        rows = iter(zip(titles, title_widths, categories, category_widths, pages, page_widths))
+        measured = []
+        for section_name, songs in sections:
+            section_rows = []
+            for title, title_width, category, category_width, page, page_width in (next(rows) for _ in songs):
+                text_width = column_width - number_width - (category_width + space_width if category else 0)
+                lines = [(title, title_width)] if title_width <= text_width else self._break_lines(title, text_width)
+                section_rows.append(IndexRow(lines, category, category_width, page, page_width, line_height * len(lines)))
+            measured.append((section_name, section_rows))
+        return measured
+
+    def _break_lines(self, text: str, width: float) -> List[Tuple[str, float]]:
+        """ Breaks the given text into lines of (at most) the given width, in the current font """
+        words = text.split(' ')
+        word_widths = self.get_string_widths(words + [' '])
+        space_width = word_widths.pop()
+
+        lines = []
+        line, line_width = [], 0
+        for word, word_width in zip(words, word_widths):
+            if line and line_width + space_width + word_width > width:
+                lines.append((' '.join(line), line_width))
+                line, line_width = [], 0
+            line_width += (space_width if line else 0) + word_width
+            line.append(word)
+        lines.append((' '.join(line), line_width))
+        return lines
+
+    def _render_index_row(self, row: 'IndexRow', x: float, y: float) -> None:
+        """
+        Renders a single entry in the index: its title, then leader dots up to its categories & page number
+        """
+        # Inside the cell margins, like the section headers
+        x += self.c_margin
+        column_width = self.get_index_column_width() - self.c_margin * 2
+        line_height = self.get_index_text_height()
+
+        for n, (line, line_width) in enumerate(row.lines[:-1]):
+            self.text_row(y + line_height * n, line_height, [(x, line, line_width)])
+
+        line, line_width = row.lines[-1]
+        page_x = x + column_width - row.page_width
+        segments = [(x, line, line_width)]
+        dots_end = page_x - self.get_string_width(' ')
+        if row.categories:
+            dots_end -= row.categories_width + self.get_string_width(' ')
+            segments.append((dots_end + self.get_string_width(' '), row.categories, row.categories_width))
+
+        dot_width = self.get_string_width('.')
+        dots = int((dots_end - (x + line_width + self.get_string_width(' '))) // dot_width)
+        if dots > 0:
+            segments.insert(1, (dots_end - dots * dot_width, '.' * dots, dots * dot_width))
+        segments.append((page_x, row.page, row.page_width))
+
+        self.text_row(y + line_height * (len(row.lines) - 1), line_height, segments)
+
+    def render_index(self, sections: List[Tuple[str, List[Dict[str, any]]]]) -> None:
+        """
+        Renders the index of this songbook, flowing its entries down Config.INDEX_COLUMNS columns per page
+        @param sections: The sections of the index - each section has a (name, List[{title, page, categories}])
         """
         if self.get_y() != Config.PDF_MARGIN_TOP:
             # If we have space left on the existing page, use it
@@ -458,9 +629,48 @@ class PDF(FPDF):
         self.render_line("Індекс", Config.TITLE_FONT)
 
         self.set_font_obj(Config.INDEX_SONG_FONT)
-
-        for section in sections:
-            self._render_index_section(section)
+        # Every entry is measured (and laid out into lines) before we write any of them
+        measured = self._measure_index(sections)
+
+        column_width = self.get_index_column_width()
+        header_height = Config.INDEX_TITLE_FONT["size"] * 2 + Config.INDEX_SONG_PADDING
+        column = 0
+        top = y = self.get_y()
+        # One link to each page, shared by all the entries on it
+        links = {}
+
+        for section_name, rows in measured:
+            for n, row in enumerate(rows):
+                # Don't start a section at the bottom of a column
+                height = row.height + (header_height if n == 0 else 0)
+                if y + height + Config.PDF_MARGIN_BOTTOM > Config.PDF_HEIGHT:
+                    column += 1
+                    if column == Config.INDEX_COLUMNS:
+                        self.add_page()
+                        column = 0
+                        top = Config.PDF_MARGIN_TOP
+                    y = top
+
+                x = Config.PDF_MARGIN_LEFT + column * (column_width + Config.INDEX_COLUMN_MARGIN)
+                if n == 0:
+                    # Write the section header
+                    self.set_font_obj(Config.INDEX_TITLE_FONT)
+                    self.set_xy(x, y + Config.INDEX_TITLE_FONT["size"])
+                    self.cell(w=column_width, h=Config.INDEX_TITLE_FONT["size"], txt=section_name)
+                    self.set_font_obj(Config.INDEX_SONG_FONT)
+                    y += header_height
+
+                self._render_index_row(row, x, y)
+
+                # Link the entry to its page
+                page = int(row.page)
+                if page not in links:
+                    links[page] = self.add_link()
+                    self.set_link(links[page], page=page)
+                self.link(x=x, y=y, w=column_width, h=row.height, link=links[page])
+                y += row.height
+
+        self.set_xy(Config.PDF_MARGIN_LEFT, y)
 
 
     def _render_chordboard(self, string_gap: float, fret_gap: float, string_y: float):
@@ -502,6 +712,12 @@ class PDF(FPDF):
         start_x = self.get_x()
         start_y = self.get_y()
 
+        def _draw_circle():
+            self.ellipse(0, 0, Config.CHORD_CIRCLE_DIAM, Config.CHORD_CIRCLE_DIAM, style='F')
+            return Config.CHORD_CIRCLE_DIAM
+
+        circle = self.template(("circle",), Config.CHORD_CIRCLE_DIAM, _draw_circle)
+
         # Draw the circles
         for string, fret in enumerate(frets):
             # Draw the fingering
@@ -512,19 +728,16 @@ class PDF(FPDF):
             x = start_x + string_gap * string
             y = start_y + fret_gap * fret
             diff = Config.CHORD_CIRCLE_DIAM / 2
-            self.ellipse(x - diff, y - diff, Config.CHORD_CIRCLE_DIAM, Config.CHORD_CIRCLE_DIAM, style='F')
+            self.place_template(circle, x - diff, y - diff)
 
-    def _render_chord(self, name: str, base: int, frets: List[int], min_x: float) -> None:
+    def _draw_chord(self, name: str, base: int, frets: List[int]) -> float:
         """
-        Render a single chord
+        Draws a single chord diagram (its name, base fret, fretboard & fingering) at the current position
         @param name: The name of the chord
         @param base: The base fret of the chord
         @param frets: The fret fingering of the chord
+        @return: The height of the diagram
         """
-
-        if max(frets) > Config.MAX_FRETS:
-            return
-
         start_x = self.get_x()
         start_y = self.get_y()
 
@@ -539,7 +752,6 @@ class PDF(FPDF):
         if base != 1:
             self.cell(Config.CHORD_WIDTH, h=info_font_size, ln=2, txt=f'Fret {base - 1}', align='C')
 
-        end_x = start_x + Config.CHORD_WIDTH
         start_text_y = self.get_y() + info_font_size
         start_chord_y = start_text_y + 3
 
@@ -548,11 +760,166 @@ class PDF(FPDF):
         fretboard_gap = Config.CHORD_HEIGHT - Config.CHORD_STRING_HEIGHT
         string_y = fretboard_gap + start_chord_y
 
-        self.set_xy(start_x, start_chord_y)
-        self._render_chordboard(string_gap, fret_gap, string_y)
+        # The strings & frets are the same for every chord
+        def _draw_chordboard():
+            self._render_chordboard(string_gap, fret_gap, fretboard_gap)
+            return Config.CHORD_HEIGHT
+
+        self.place_template(self.template(("chordboard",), Config.CHORD_WIDTH, _draw_chordboard), start_x, start_chord_y)
+        self.set_xy(start_x, string_y)
         self._render_chord_fingering(frets, string_gap, fret_gap, start_text_y)
 
-        end_y = string_y + Config.CHORD_STRING_HEIGHT
+        return string_y + Config.CHORD_STRING_HEIGHT - start_y
+
+    def template(self, key: Tuple, width: float, draw: Callable[[], float]) -> Dict[str, any]:
+        """
+        Returns the form XObject with the given key, drawing it the first time it's used.
+        Whatever is drawn as a template is only ever drawn once per PDF; every use after that is a reference to it
+        @param key: What the template shows (eg. a chord shape)
+        @param width: The width of the template
+        @param draw: Draws the template at the current position, and returns its height
+        """
+        template = self.templates.get(key)
+        if template is not None:
+            return template
+
+        # Draw the template on its own, at the top left corner of an empty page, and keep what was drawn
+        state = self._graphics_state()
+        page_content = self.pages[self.page]
+        self.pages[self.page] = ''
+        # The template sets its own fonts, colors & line width, since it can be placed anywhere (and so that it's the
+        #   same, whatever it was first drawn after)
+        self._restore_graphics_state(self.initial_state)
+        self.font_family = ''
+        self._out(self.draw_color)
+        self._out(self.fill_color)
+        self._out('%.2F w' % (self.line_width * self.k))
+        self.set_xy(0, 0)
+        height = draw()
+
+        # Named after what it shows, so that the same template has the same name in every PDF (pages which place it
+        #   can be replayed in another PDF - see PageRecord)
+        name = 'T' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:8]
+        template = {'name': name, 'n': None, 'w': width, 'h': height, 'content': self.pages[self.page]}
+        self.templates[key] = template
+        self.pages[self.page] = page_content
+        self._restore_graphics_state(state)
+        return template
+
+    def place_template(self, template: Dict[str, any], x: float, y: float, scale: float = 1) -> None:
+        """ Places a template with its top left corner at the given position (scaled by the given factor) """
+        # (the template was drawn at the top left corner of the page; scaling is around the bottom left corner)
+        self._out('q %.2F 0 0 %.2F %.2F %.2F cm /%s Do Q' % (scale, scale, x * self.k, (self.h * (1 - scale) - y) * self.k,
+                                                            template['name']))
+
+    def chord_template(self, name: str, base: int, frets: List[int]) -> Dict[str, any]:
+        """ Returns the template of the given chord diagram (see template) """
+        return self.template((name, base, tuple(frets)), Config.CHORD_WIDTH, lambda: self._draw_chord(name, base, frets))
+
+    def place_chord(self, name: str, base: int, frets: List[int], x: float, y: float, scale: float = 1) -> float:
+        """
+        Places the diagram of a chord with its top left corner at the given position
+        @return: The height of the diagram (as placed)
+        """
+        template = self.chord_template(name, base, frets)
+        self.placed_diagrams.append((name, base, tuple(frets)))
+        self.place_template(template, x, y, scale)
+        return template['h'] * scale
+
+    def chord_shape(self, chord: str) -> Optional[ChordShape]:
+        """ How the given chord is played: from the dictionary, or worked out (or None, if we can't play it) """
+        shape = ChordDictionary.get().shape(chord)
+        if shape is None:
+            # Work out how to play the chords we don't know
+            shape = Voicings.get().shape(ChordDictionary.get().symbol(chord))
+        return shape
+
+    def song_diagrams(self, song: Song) -> List[Tuple[str, ChordShape]]:
+        """
+        The chord diagrams shown with a song (if Config.SONG_CHORD_DIAGRAMS): one for each chord it uses (in the
+        order they first come up), named as the chord page names them
+        """
+        if not Config.SONG_CHORD_DIAGRAMS:
+            return []
+
+        diagrams: Dict[ChordShape, str] = {}
+        for line in song.lyrics:
+            for _, written in line.chords:
+                # (without the parentheses of optional chords, as in Song.chords; and chords written together,
+                #   eg. Am/E7/Am, are shown one by one)
+                for chord in ChordDictionary.get().split(Config.RE_CHORD.match(f"[{written}]").group(1)):
+                    shape = self.chord_shape(chord)
+                    if shape is not None and max(shape.frets) <= Config.MAX_FRETS:
+                        diagrams.setdefault(shape, str(ChordDictionary.get().symbol(chord)))
+        return [(name, shape) for shape, name in diagrams.items()]
+
+    def render_song_diagrams(self, diagrams: List[Tuple[str, ChordShape]]) -> None:
+        """ Renders the chord diagrams of a song in rows (see SongMeasurer.diagrams_per_row), under its title """
+        if not diagrams:
+            return
+
+        scale = Config.SONG_CHORD_DIAGRAM_SCALE
+        per_row = SongMeasurer.diagrams_per_row()
+        row_height = SongMeasurer.diagram_row_height()
+        height = -(-len(diagrams) // per_row) * row_height
+        # (as a cell would, we break the page if they don't fit)
+        if self.get_y() + height > self.page_break_trigger:
+            self.add_page()
+
+        start_y = self.get_y()
+        for i, (name, shape) in enumerate(diagrams):
+            x = Config.PDF_MARGIN_LEFT + (i % per_row) * (Config.CHORD_WIDTH + Config.CHORD_MARGIN_HORIZONTAL) * scale
+            self.place_chord(name, shape.base, list(shape.frets), x, start_y + (i // per_row) * row_height, scale)
+        self.set_y(start_y + height)
+
+    def _puttemplates(self) -> None:
+        """ Writes every template we drew as a form XObject """
+        # The templates were drawn at the top left corner of the page (chord circles go a little past their edges)
+        margin = Config.CHORD_CIRCLE_DIAM
+        for template in self.templates.values():
+            content = template['content'].encode("latin1")
+            content_filter = ''
+            if self.compress:
+                content = zlib.compress(content)
+                content_filter = '/Filter /FlateDecode '
+
+            self._newobj()
+            template['n'] = self.n
+            self._out('<</Type /XObject /Subtype /Form')
+            self._out('/BBox [%.2F %.2F %.2F %.2F]' % (-margin * self.k, (self.h - template['h'] - margin) * self.k,
+                                                      (template['w'] + margin) * self.k, (self.h + margin) * self.k))
+            self._out('/Resources 2 0 R')
+            self._out(content_filter + '/Length ' + str(len(content)) + '>>')
+            self._putstream(content)
+            self._out('endobj')
+
+    def _putimages(self):
+        super()._putimages()
+        self._puttemplates()
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for template in self.templates.values():
+            self._out('/%s %d 0 R' % (template['name'], template['n']))
+
+    def _render_chord(self, name: str, base: int, frets: List[int], min_x: float) -> None:
+        """
+        Render a single chord on the chord page
+        @param name: The name of the chord
+        @param base: The base fret of the chord
+        @param frets: The fret fingering of the chord
+        """
+
+        if max(frets) > Config.MAX_FRETS:
+            return
+
+        start_x = self.get_x()
+        start_y = self.get_y()
+
+        height = self.place_chord(name, base, frets, start_x, start_y)
+
+        end_x = start_x + Config.CHORD_WIDTH
+        end_y = start_y + height
         # Update the X and Y
         next_end_x = end_x + Config.CHORD_MARGIN_HORIZONTAL + Config.CHORD_WIDTH + Config.PDF_MARGIN_RIGHT
         if next_end_x > Config.PDF_WIDTH:
@@ -594,23 +961,248 @@ class PDF(FPDF):
         start_x = Config.PDF_MARGIN_LEFT + (space_left / 2)
         self.set_x(start_x)
 
+        # Chords which are played the same (eg. aliases, like Am & Amin) get a single diagram, named as they're used
+        shapes: Dict[ChordShape, List[str]] = {}
         for chord in chords:
-            if chord in Config.KNOWN_CHORDS:
-                chord_obj = Config.KNOWN_CHORDS[chord]
-
-                while "copy" in chord_obj:
-                    chord = chord_obj['copy']
-                    chord_obj = Config.KNOWN_CHORDS[chord]
-
-                self._render_chord(chord, chord_obj['base'], chord_obj['frets'], start_x)
-            else:
+            shape = self.chord_shape(chord)
+            if shape is None:
                 print(f"No chord '{chord}'")
+                continue
+            names = shapes.setdefault(shape, [])
+            name = str(ChordDictionary.get().symbol(chord))
+            if name not in names:
+                names.append(name)
 
+        for shape, names in shapes.items():
+            self._render_chord(", ".join(names), shape.base, shape.frets, start_x)
 
         self.set_y(self.get_y() + Config.CHORD_HEIGHT * 2)
 
 
-TEMP_PDF = PDF()
+class SectionFragment(NamedTuple):
+    """ A section rendered on its own, to be added to the songbook once we know which page it starts on """
+    pages: List[PageRecord]  # The content of each page (without the footer, which needs the final page number)
+    index: List[Dict[str, any]]  # The index entries of the section, numbered from the first page of the section
+    chords: Set[str]  # Every chord used in the section
+
+
+class IndexRow(NamedTuple):
+    """ An entry of the index, measured & broken into lines to fit its column """
+    lines: List[Tuple[str, float]]  # The lines of the title, and their widths
+    categories: str  # The categories shown before the page number (if any)
+    categories_width: float
+    page: str  # The page number
+    page_width: float
+    height: float
+
+
+"""
+A PDF which keeps each page it finishes as a PageRecord, instead of adding a footer to it.
+A section rendered on a FragmentPDF can be added to any page of the songbook, by replaying its pages there.
+"""
+class FragmentPDF(PDF):
+    def __init__(self):
+        self.fragment_pages: List[PageRecord] = []
+        super().__init__()
+        self._begin_fragment_page()
+
+    def _begin_fragment_page(self) -> None:
+        # Everything written to the page from here on is the content of the song(s) on it
+        self.page_start = len(self.pages[self.page])
+        self.record_start = self._record_start()
+
+    def add_page(self, orientation=''):
+        super().add_page(orientation)
+        self._begin_fragment_page()
+
+    def footer(self):
+        self.fragment_pages.append(self._page_record(self.page_start, self.record_start))
+
+
+def render_section(section: Tuple[str, List[Song], bool]) -> Tuple[SectionFragment, Dict, Dict]:
+    """
+    Renders a single section on its own (eg. in a worker process)
+    @param section: The section (section_name, List[songs], sort_sec_by_name?)
+    @return: The rendered section, and the layouts & pages it added to the caches
+    """
+    section_name, songs, sort_by_name = section
+    print(f"Section '{section_name}'", flush=True)
+
+    pdf = FragmentPDF()
+    section_index, section_chords = pdf.render_songs(songs, sort_by_name)
+    return (SectionFragment(pdf.fragment_pages, section_index, section_chords),
+            LayoutCache.get().layouts, PageCache.get().used_pages())
+
+
+"""
+A PDF which writes every page to the output file as soon as the page is finished, instead of keeping the whole
+document in memory until the end. Only the (small) page dictionaries, links and fonts are written at the end,
+when we know every link destination and every character used; the cross-reference table then points at
+wherever each object ended up in the file.
+"""
+class StreamingPDF(PDF):
+    def __init__(self, outfile: str):
+        """
+        @param outfile: The location of the resulting PDF
+        """
+        self.filepath = outfile
+        # The PDF is written to a file alongside, which only replaces the output file once it's finished
+        self.partfile = outfile + '.part'
+        self.outfile = open(self.partfile, 'wb')
+        # The number of bytes already written to the output file
+        self.written = 0
+        super().__init__()
+
+    def _offset(self) -> int:
+        """ The offset (in the output file) the next line we write goes to """
+        return self.written + len(self.buffer)
+
+    def _flush(self) -> None:
+        """ Writes the buffer to the output file, and empties it """
+        self.outfile.write(self.buffer.encode("latin1"))
+        self.written += len(self.buffer)
+        self.buffer = ''
+
+    def _newobj(self):
+        # Each object is written out before we start the next, so the buffer never holds more than one
+        self._flush()
+        self.n += 1
+        self.offsets[self.n] = self._offset()
+        self._out(str(self.n) + ' 0 obj')
+
+    def _endpage(self):
+        super()._endpage()
+        if self.page == 1:
+            self._putheader()
+
+        # The page object is always 1 + 2n, and its contents are the object right after it
+        #   (so we can write the contents now, and link to the page from anywhere, before we write the page itself)
+        content = self.pages[self.page].encode("latin1")
+        content_filter = ''
+        if self.compress:
+            content = zlib.compress(content)
+            content_filter = '/Filter /FlateDecode '
+
+        n = 2 + 2 * self.page
+        self.offsets[n] = self._offset()
+        self._out(str(n) + ' 0 obj')
+        self._out('<<' + content_filter + '/Length ' + str(len(content)) + '>>')
+        self._putstream(content)
+        self._out('endobj')
+        self._flush()
+
+        # We're done with this page
+        self.pages[self.page] = ''
+        # FPDF notes down every character it writes (to subset the fonts). Only the first occurrence of each matters
+        for font in self.fonts.values():
+            if 'subset' in font:
+                font['subset'] = list(dict.fromkeys(font['subset']))
+
+    def _putpages(self):
+        # Write out the page objects (without their contents, which are already written), then the pages root
+        nb = self.page
+        w_pt, h_pt = (self.fw_pt, self.fh_pt) if self.def_orientation == 'P' else (self.fh_pt, self.fw_pt)
+
+        for n in range(1, nb + 1):
+            self._flush()
+            self.n = 1 + 2 * n
+            self.offsets[self.n] = self._offset()
+            self._out(str(self.n) + ' 0 obj')
+            self._out('<</Type /Page')
+            self._out('/Parent 1 0 R')
+            if n in self.orientation_changes:
+                self._out('/MediaBox [0 0 %.2f %.2f]' % (h_pt, w_pt))
+            self._out('/Resources 2 0 R')
+            if n in self.page_links:
+                annots = '/Annots ['
+                for x, y, w, h, link in self.page_links[n]:
+                    annots += '<</Type /Annot /Subtype /Link /Rect [%.2f %.2f %.2f %.2f] /Border [0 0 0] ' % (
+                        x, y, x + w, y - h)
+                    if isinstance(link, str):
+                        annots += '/A <</S /URI /URI ' + self._textstring(link) + '>>>>'
+                    else:
+                        page, dest_y = self.links[link]
+                        page_h = w_pt if page in self.orientation_changes else h_pt
+                        annots += '/Dest [%d 0 R /XYZ 0 %.2f null]>>' % (1 + 2 * page, page_h - dest_y * self.k)
+                self._out(annots + ']')
+            if self.pdf_version > '1.3':
+                self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+            self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+            self._out('endobj')
+        self.n = 2 + 2 * nb
+
+        # Pages root
+        self._flush()
+        self.offsets[1] = self._offset()
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(str(3 + 2 * i) + ' 0 R ' for i in range(nb)) + ']')
+        self._out('/Count ' + str(nb))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+        self._out('>>')
+        self._out('endobj')
+
+    def _putresources(self):
+        self._putfonts()
+        self._putimages()
+        # Resource dictionary
+        self._flush()
+        self.offsets[2] = self._offset()
+        self._out('2 0 obj')
+        self._out('<<')
+        self._putresourcedict()
+        self._out('>>')
+        self._out('endobj')
+
+    def _enddoc(self):
+        # The header was written with the first page
+        self._putpages()
+        self._putresources()
+        # Info
+        self._newobj()
+        self._out('<<')
+        self._putinfo()
+        self._out('>>')
+        self._out('endobj')
+        # Catalog
+        self._newobj()
+        self._out('<<')
+        self._putcatalog()
+        self._out('>>')
+        self._out('endobj')
+        # Cross-ref
+        self._flush()
+        o = self._offset()
+        self._out('xref')
+        self._out('0 ' + str(self.n + 1))
+        self._out('0000000000 65535 f ')
+        for i in range(1, self.n + 1):
+            self._out('%010d 00000 n ' % self.offsets[i])
+        # Trailer
+        self._out('trailer')
+        self._out('<<')
+        self._puttrailer()
+        self._out('>>')
+        self._out('startxref')
+        self._out(o)
+        self._out('%%EOF')
+        self._flush()
+        self.state = 3
+
+    def output(self, name='', dest=''):
+        """ Finishes the document; everything has already been written to the output file """
+        if self.state < 3:
+            self.close()
+        self.outfile.close()
+        os.replace(self.partfile, self.filepath)
+        return ''
+
+    def discard(self) -> None:
+        """ Stops writing an unfinished PDF, and removes it; the output file is left as it was """
+        if not self.outfile.closed:
+            self.outfile.close()
+            os.remove(self.partfile)
+
 
 def render_pdf(sections: List[Tuple[str, List[Song], bool]], outfile: str):
     """
@@ -619,18 +1211,35 @@ def render_pdf(sections: List[Tuple[str, List[Song], bool]], outfile: str):
     @param sections: The sections of the songbook. A section is List[(section_name, List[songs], sort_sec_by_name?)]
     """
     # Create the PDF object
-    pdf = PDF()
-
-    # Do some writing
-    section_indexes = []
-    chords = set()
-    for section_name, songs, sort_by_name in sections:
-        print(f"Section '{section_name}'", flush=True)
-        section_index, section_chords = pdf.render_songs(songs, sort_by_name)
-        section_indexes.append((section_name, section_index))
-        chords.update(section_chords)
-
-    print("Rendering index & chord chart")
-    pdf.render_chords(sorted(chords))
-    pdf.render_index(section_indexes)
-    pdf.output(outfile, 'F')
+    pdf = StreamingPDF(outfile) if Config.PDF_STREAM_OUTPUT else PDF()
+
+    try:
+        # Do some writing
+        section_indexes = []
+        chords = set()
+        if Config.PDF_RENDER_WORKERS > 1 and len(sections) > 1:
+            # Every section starts on a new page, in the same state - so the sections can be rendered separately,
+            #   and then added one after the other
+            with Utils.process_pool(min(Config.PDF_RENDER_WORKERS, len(sections)), BuildConfig.current().apply) as pool:
+                for (section_name, _, _), (fragment, layouts, pages) in zip(sections, pool.map(render_section, sections)):
+                    LayoutCache.get().merge(layouts)
+                    PageCache.get().merge(pages)
+                    section_index, section_chords = pdf.render_fragment(fragment)
+                    section_indexes.append((section_name, section_index))
+                    chords.update(section_chords)
+        else:
+            for section_name, songs, sort_by_name in sections:
+                print(f"Section '{section_name}'", flush=True)
+                section_index, section_chords = pdf.render_songs(songs, sort_by_name)
+                section_indexes.append((section_name, section_index))
+                chords.update(section_chords)
+
+        print("Rendering index & chord chart")
+        # (chords written together, eg. Am/E7/Am, are shown one by one)
+        pdf.render_chords(sorted({chord for name in chords for chord in ChordDictionary.get().split(name)}))
+        pdf.render_index(section_indexes)
+        pdf.output(outfile, 'F')
+    finally:
+        if isinstance(pdf, StreamingPDF):
+            # (if the build failed, the last PDF we built is left as it was)
+            pdf.discard()
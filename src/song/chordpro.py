@@ -0,0 +1,129 @@
+import io
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from consts import Config
+
+
+class Directive(NamedTuple):
+    """ A ChordPro directive, eg. {title: ...} or {meta: alt_title ...} """
+    command: str
+    args: str
+
+
+class LyricLine(NamedTuple):
+    """ A single line of lyrics """
+    text: str  # The lyrics, without chords or markup
+    chords: Tuple[Tuple[int, str], ...] = ()  # Every chord, and the offset in the text it's placed at
+    indented: bool = False
+    bold: bool = False
+
+    @property
+    def blank(self) -> bool:
+        return not (self.text.strip() or self.chords or self.bold)
+
+    def segments(self) -> List[Tuple[str, Optional[str]]]:
+        """ Splits the text at every chord; each segment is followed by the chord placed after it (if any) """
+        segments = []
+        start = 0
+        for offset, chord in self.chords:
+            segments.append((self.text[start:offset], chord))
+            start = offset
+        segments.append((self.text[start:], None))
+        return segments
+
+
+"""
+A song, parsed from a ChordPro file.
+Every line is tokenized exactly once - nothing downstream needs to look at the raw text again.
+"""
+class ChordProSong:
+    # Bump this whenever parsing changes, so that songs parsed by an older version aren't reused
+    PARSER_VERSION: int = 1
+
+    def __init__(self):
+        self.title: Optional[str] = None
+        self.alt_titles: List[str] = []
+        self.categories: List[str] = []
+        self.meta: List[Directive] = []  # The directives which are rendered (titles & subtitles)
+        self.lyrics: List[LyricLine] = []
+        self.chords: Set[str] = set()
+
+    @classmethod
+    def parse_file(cls, filepath: str) -> 'ChordProSong':
+        with open(filepath, encoding='utf-8') as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def parse(cls, text: str) -> 'ChordProSong':
+        song = ChordProSong()
+
+        for line in io.StringIO(text):
+            if line.startswith('#'):
+                continue
+
+            if line.startswith('{'):
+                directive = cls._parse_directive(line)
+                if directive:
+                    song._add_directive(directive, line)
+                    continue
+
+            song.lyrics.append(cls._parse_lyric_line(line))
+
+        # Lyrics _almost_ always have a dummy line up top
+        if song.lyrics and song.lyrics[0].blank:
+            song.lyrics = song.lyrics[1:]
+
+        song.chords = {Config.RE_CHORD.match(f"[{chord}]").group(1)
+                       for line in song.lyrics for _, chord in line.chords}
+        return song
+
+    @staticmethod
+    def _parse_directive(line: str) -> Optional[Directive]:
+        match = Config.RE_DIRECTIVE.match(line)
+        if match:
+            return Directive(match.group('command'), match.group('args'))
+        if Config.RE_META.match(line):
+            return Directive('', line)
+        return None
+
+    def _add_directive(self, directive: Directive, line: str) -> None:
+        if directive.command == 'title':
+            self.meta.append(directive)
+            # The file takes precedence
+            self.title = directive.args
+        elif directive.command == 'alt_title':
+            self.meta.append(directive)
+            self.alt_titles.append(directive.args)
+        elif directive.command == 'subtitle':
+            self.meta.append(directive)
+        elif directive.command == 'category':
+            self.categories.append(directive.args)
+        # An unsupported command (ie. one I didn't implement because I don't use it)
+        else:
+            print(f"Matched an unsupported command, skipping: {line}")
+
+    @staticmethod
+    def _parse_lyric_line(line: str) -> LyricLine:
+        # Check if this line is indented, then strip all whitespace
+        indented = line.startswith('\t')
+        line = line.strip()
+
+        # Check if this line is bolded
+        bold = Config.RE_BOLD.match(line)
+        if bold:
+            line = bold.group(1)
+
+        # Pull out the chords, remembering where in the text they go
+        text = []
+        chords = []
+        offset = 0
+        start = 0
+        for match in Config.RE_LYRICS_CHORD.finditer(line):
+            segment = line[start:match.start()]
+            text.append(segment)
+            offset += len(segment)
+            chords.append((offset, match.group(1)))
+            start = match.end()
+        text.append(line[start:])
+
+        return LyricLine(''.join(text), tuple(chords), indented, bool(bold))
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from consts import Config
+from song.local_song import LocalSong
+from utils import Utils
+
+
+"""
+An index over every song saved locally in the SONG_DIR.
+Maps normalized titles, alternate titles, and filenames to the file which contains the song,
+so we never have to ask WikiSpiv about a song we already have on disk.
+"""
+class SongCorpus:
+    INDEX_VERSION: int = 2
+    INDEX_FILE: str = os.path.join(Config.CACHE_DIR, 'corpus_index.json')
+
+    _instance: Optional['SongCorpus'] = None
+
+    def __init__(self, song_dir: str = LocalSong.SONG_DIR, index_file: str = INDEX_FILE):
+        self.song_dir = song_dir
+        self.index_file = index_file
+
+        # filename -> {"mtime", "size", "hash", "title", "alt_titles"}
+        self.files: Dict[str, Dict] = {}
+        # normalized title -> filename
+        self.titles: Dict[str, str] = {}
+
+        self._load()
+        self.refresh()
+
+    @classmethod
+    def get(cls) -> 'SongCorpus':
+        """ Returns the shared corpus of the SONG_DIR, building it on first use """
+        if cls._instance is None:
+            cls._instance = SongCorpus()
+        return cls._instance
+
+    @staticmethod
+    def normalize(song_title: str) -> str:
+        """ Normalizes a title, so that small differences in case and punctuation don't matter """
+        return Utils.snake_case(song_title.strip())
+
+    def find(self, song_title: str) -> Optional[str]:
+        """ Returns the path of the file containing the given song, or None if we don't have it locally """
+        filename = self.titles.get(self.normalize(song_title))
+        return os.path.join(self.song_dir, filename) if filename else None
+
+    def content_hash(self, filepath: str) -> str:
+        """ Returns the hash of the contents of the given song file, only re-reading the file if it changed """
+        entry = self.files.get(os.path.basename(filepath))
+        stat = os.stat(filepath)
+        if not entry or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            self.add(filepath)
+            entry = self.files[os.path.basename(filepath)]
+        return entry["hash"]
+
+    def add(self, filepath: str) -> None:
+        """ Adds (or updates) a single song file in the index, eg. after downloading it """
+        stat = os.stat(filepath)
+        self.files[os.path.basename(filepath)] = self._read_entry(filepath, stat)
+        self._build_titles()
+        self.save()
+
+    def refresh(self) -> None:
+        """ Scans the SONG_DIR once, and re-reads only the files which were added or changed since the last scan """
+        files = {}
+        changed = False
+
+        with os.scandir(self.song_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.cho') or not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                cached = self.files.get(entry.name)
+                if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                    files[entry.name] = cached
+                else:
+                    files[entry.name] = self._read_entry(entry.path, stat)
+                    changed = True
+
+        changed = changed or len(files) != len(self.files)
+        self.files = files
+        self._build_titles()
+
+        if changed:
+            self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.INDEX_VERSION, "song_dir": self.song_dir, "files": self.files},
+                      f, ensure_ascii=False)
+
+    def _load(self) -> None:
+        """ Loads the persisted index, if it exists and matches this SONG_DIR """
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if index.get("version") == self.INDEX_VERSION and index.get("song_dir") == self.song_dir:
+            self.files = index["files"]
+
+    @staticmethod
+    def _read_entry(filepath: str, stat: os.stat_result) -> Dict:
+        """ Reads the titles from a single song file """
+        title = None
+        alt_titles: List[str] = []
+
+        with open(filepath, 'rb') as f:
+            content = f.read()
+
+        for line in content.decode('utf-8').splitlines():
+            if not line.startswith('{'):
+                continue
+            if Config.RE_TITLE.match(line):
+                title = Config.RE_TITLE.match(line).group('args')
+            elif Config.RE_ALT_TITLE.match(line):
+                alt_titles.append(Config.RE_ALT_TITLE.match(line).group('args'))
+
+        return {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": hashlib.sha1(content).hexdigest(),
+                "title": title, "alt_titles": alt_titles}
+
+    def _build_titles(self) -> None:
+        """ Rebuilds the title lookup. Filenames take precedence over titles, which take precedence over alt. titles """
+        titles = {}
+        for filename, entry in sorted(self.files.items()):
+            for alt_title in entry["alt_titles"]:
+                titles[self.normalize(alt_title)] = filename
+        for filename, entry in sorted(self.files.items()):
+            if entry["title"]:
+                titles[self.normalize(entry["title"])] = filename
+        for filename in sorted(self.files):
+            titles[filename[:-len('.cho')]] = filename
+
+        self.titles = titles
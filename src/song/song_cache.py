@@ -0,0 +1,69 @@
+import os
+import pickle
+from typing import Dict, Optional
+
+from consts import Config
+from song.chordpro import ChordProSong
+from song.corpus import SongCorpus
+
+
+"""
+A cache of parsed songs, saved as a single file and keyed on the hash of each song file's contents.
+Unchanged songs are loaded without being parsed (or even opened); only edited songs are parsed again.
+The whole cache is dropped when the parser changes (see ChordProSong.PARSER_VERSION).
+"""
+class ParsedSongCache:
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'parsed_songs.pickle')
+
+    _instance: Optional['ParsedSongCache'] = None
+
+    def __init__(self, corpus: SongCorpus, cache_file: str = CACHE_FILE):
+        self.corpus = corpus
+        self.cache_file = cache_file
+        # content hash -> parsed song
+        self.songs: Dict[str, ChordProSong] = {}
+        self.dirty = False
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'ParsedSongCache':
+        """ Returns the shared cache, loading it on first use """
+        if cls._instance is None:
+            cls._instance = ParsedSongCache(SongCorpus.get())
+        return cls._instance
+
+    def parse(self, filepath: str) -> ChordProSong:
+        """ Returns the parsed song saved in the given file, parsing it only if it isn't cached """
+        content_hash = self.corpus.content_hash(filepath)
+        song = self.songs.get(content_hash)
+
+        if song is None:
+            song = ChordProSong.parse_file(filepath)
+            self.songs[content_hash] = song
+            self.dirty = True
+
+        return song
+
+    def save(self) -> None:
+        """ Saves the cache (if anything changed), dropping the songs which are no longer in the corpus """
+        if not self.dirty:
+            return
+
+        current = {entry["hash"] for entry in self.corpus.files.values()}
+        songs = {content_hash: song for content_hash, song in self.songs.items() if content_hash in current}
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump((ChordProSong.PARSER_VERSION, songs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'rb') as f:
+                version, songs = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+            return
+
+        if version == ChordProSong.PARSER_VERSION:
+            self.songs = songs
@@ -1,8 +1,10 @@
-from typing import List, Optional
-from bs4 import BeautifulSoup
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 from consts import Config
+from song.corpus import SongCorpus
 from song.local_song import LocalSong
+from song.wikispiv_cache import WikiSpivCache
 
 
 class WikiSpivSong:
@@ -13,21 +15,171 @@ class WikiSpivSong:
 		if LocalSong.exists(self.song_title):
 			raise f"Song '{song_title}' already exists on disk; Will not create a new WikiSpivSong"
 
-		self.alt_titles = self._get_backlinks(song_title)
+		self.alt_titles = self._get_backlinks(self.song_title)
+
+	@staticmethod
+	def _session() -> 'WikiSpivSession':
+		""" The shared session. Importing requests (and bs4) is a good part of our startup time,
+		so we only import them once we actually go to WikiSpiv """
+		from song.wikispiv_session import WikiSpivSession
+		return WikiSpivSession.get()
 
 	@classmethod
 	def standardize_song_name(cls, song_title: str):
 		""" Tries finding the closest-matching title in WikiSpiv,
 		then tries finding the "root" song title (i.e. the most popular/used one) """
 
+		cache = WikiSpivCache.get()
+		cached = cache.get_title(song_title)
+		if cached:
+			return cached["title"]
+
+		if Config.WIKI_OFFLINE:
+			print(f"'{song_title}' is not cached, and we're offline; using it as-is")
+			return song_title
+
 		closest_matching_title = cls._get_closest_matching_song_title(song_title)
 
 		# It's possible WikiSpiv has no results; in that case, keep using the raw name
+		main_title = song_title
 		if closest_matching_title:
-			song_title = closest_matching_title
+			main_title = closest_matching_title
 
 		# Try finding the "main" title of the song
-		return cls._get_main_song_title(song_title)
+		main_title = cls._get_main_song_title(main_title)
+		cache.set_title(song_title, main_title, found=closest_matching_title is not None)
+		return main_title
+
+	@classmethod
+	def resolve_titles(cls, song_titles: List[str]) -> Dict[str, str]:
+		""" Resolves the main title (and the backlinks) of every given title we don't have locally or cached,
+		in as few requests as possible. The results are cached, so that resolving each song later is free.
+		:return: A dict mapping each newly resolved title to its main title
+		"""
+		cache = WikiSpivCache.get()
+		corpus = SongCorpus.get()
+		unresolved = sorted({title for title in song_titles if not corpus.find(title) and not cache.get_title(title)})
+
+		if not unresolved or Config.WIKI_OFFLINE:
+			return {}
+
+		print(f"Resolving {len(unresolved)} titles in WikiSpiv")
+		pages = cls._query_pages(unresolved)
+
+		# Titles without a page of their own need a search to find the closest match - these can't be batched
+		closest_titles = {}
+		for title in unresolved:
+			if pages[title][1] is None:
+				closest_titles[title] = cls._get_closest_matching_song_title(title)
+		pages.update(cls._query_pages(sorted({t for t in closest_titles.values() if t})))
+
+		resolved = {}
+		for title in unresolved:
+			closest_title = closest_titles.get(title, title)
+			main_title, backlinks = pages[closest_title or title]
+
+			cache.set_title(title, main_title, found=closest_title is not None)
+			if backlinks is not None:
+				cache.set_backlinks(main_title, backlinks)
+			resolved[title] = main_title
+
+		return resolved
+
+	@classmethod
+	def prefetch_songs(cls, song_titles: List[str]) -> List[str]:
+		""" Downloads every given song we don't have locally, concurrently (up to Config.WIKI_MAX_WORKERS at a time).
+		A song which fails to download doesn't stop the others; it's reported, and skipped.
+		:return: The paths of the downloaded songs
+		"""
+		if Config.WIKI_OFFLINE:
+			return []
+
+		corpus = SongCorpus.get()
+		missing = list(dict.fromkeys(title for title in song_titles if not corpus.find(title)))
+		if not missing:
+			return []
+
+		claimed = set()
+		lock = threading.Lock()
+
+		def download(song_title):
+			# Finding the main title may have to ask WikiSpiv too (if resolve_titles didn't cache it),
+			#   so it's part of the download, and fails (or not) along with it
+			main_title = cls.standardize_song_name(song_title)
+			# Different titles may lead to the same song; we only need to download it once
+			with lock:
+				if main_title in claimed or corpus.find(main_title):
+					return None
+				claimed.add(main_title)
+
+			ws = WikiSpivSong(song_title)
+			ws.download_song()
+			return ws.filepath
+
+		print(f"Downloading {len(missing)} songs from WikiSpiv")
+		downloaded = []
+		with ThreadPoolExecutor(max_workers=Config.WIKI_MAX_WORKERS) as executor:
+			futures = {executor.submit(download, title): title for title in missing}
+			for future in as_completed(futures):
+				# Isolate the failure of each song, whatever it is
+				try:
+					filepath = future.result()
+				except Exception as e:
+					print(f"Couldn't download '{futures[future]}' from WikiSpiv: {e}")
+					continue
+				if filepath:
+					downloaded.append(filepath)
+
+		for filepath in downloaded:
+			corpus.add(filepath)
+
+		return downloaded
+
+	@classmethod
+	def _query_pages(cls, titles: List[str]) -> Dict[str, Tuple[str, Optional[List[str]]]]:
+		""" Follows the redirects of the given titles, and finds the backlinks of the pages they lead to.
+		Queries Config.WIKI_API_BATCH_SIZE titles at a time.
+		:return: A dict mapping each title to its main title, and that page's backlinks (None if the page is missing)
+		"""
+		results = {}
+		for i in range(0, len(titles), Config.WIKI_API_BATCH_SIZE):
+			batch = titles[i:i + Config.WIKI_API_BATCH_SIZE]
+			params = {"action": "query", "titles": '|'.join(batch), "redirects": "", "prop": "redirects",
+					  "rdlimit": "max"}
+
+			renamed = {}
+			pages = {}
+			while True:
+				response = cls._session().request(Config.WIKI_API_URL, params).json()
+				query = response.get("query", {})
+				# Both normalization (eg. capitalization) and redirects rename the title we asked for
+				for rename in query.get("normalized", []) + query.get("redirects", []):
+					renamed[rename["from"]] = rename["to"]
+
+				for page in query.get("pages", {}).values():
+					entry = pages.setdefault(page["title"], {"missing": "missing" in page or "invalid" in page,
+															 "backlinks": []})
+					entry["backlinks"].extend(redirect["title"] for redirect in page.get("redirects", []))
+
+				# The backlinks may be split across multiple responses
+				if "continue" not in response:
+					break
+				params.update(response["continue"])
+
+			for title in batch:
+				main_title = title
+				seen = set()
+				while main_title in renamed and main_title not in seen:
+					seen.add(main_title)
+					main_title = renamed[main_title]
+
+				page = pages.get(main_title)
+				if page is None or page["missing"]:
+					results[title] = (main_title, None)
+				else:
+					results[title] = (main_title, sorted(page["backlinks"]))
+
+		return results
 
 	@classmethod
 	def _get_closest_matching_song_title(cls, song_title: str) -> Optional[str]:
@@ -36,11 +188,11 @@ class WikiSpivSong:
 		base_url = f"{Config.WIKI_API_URL}&action=query&list=search&srsearch={song_title}&srwhat="
 		
 		# We try the most specific search type first
-		response = requests.get(f"{base_url}nearmatch").json()
+		response = cls._session().request(f"{base_url}nearmatch").json()
 		results = response["query"]["search"]
 
 		if len(results) == 0:
-			response = requests.get(f"{base_url}title").json()
+			response = cls._session().request(f"{base_url}title").json()
 			results = response["query"]["search"]
 
 		return results[0]["title"] if results else None
@@ -50,7 +202,7 @@ class WikiSpivSong:
 		""" Some songs have multiple names - this finds the "root" name that WikiSpiv redirects to. """
 
 		url = f"{Config.WIKI_API_URL}&action=query&titles={song_title}&redirects"
-		response = requests.get(url).json()
+		response = cls._session().request(url).json()
 		# Get the resulting page from this query. This is the root page - ie. follow all redirects until there are no more
 		#   If a page has no redirects, the root page is itself
 		redirect_pages = response["query"]["pages"].values()
@@ -58,10 +210,25 @@ class WikiSpivSong:
 
 		return root_page["title"]
 	
-	def _get_backlinks(self, title: str) -> List[str]:
+	@classmethod
+	def _get_backlinks(cls, title: str) -> List[str]:
 		""" Find every page which redirects to this page """
+		cache = WikiSpivCache.get()
+		cached = cache.get_backlinks(title)
+		if cached is not None:
+			return cached
+
+		if Config.WIKI_OFFLINE:
+			return []
+
+		backlinks = cls._get_uncached_backlinks(title)
+		cache.set_backlinks(title, backlinks)
+		return backlinks
+
+	@classmethod
+	def _get_uncached_backlinks(cls, title: str) -> List[str]:
 		url = f"{Config.WIKI_API_URL}&action=query&generator=redirects&titles={title}"
-		response = requests.get(url).json()
+		response = cls._session().request(url).json()
 
 		if "query" not in response or "pages" not in response["query"]:
 			return []
@@ -72,12 +239,16 @@ class WikiSpivSong:
 		""" Downloads the Wiki page of the given song, and parses its contents
 		:return: A tuple containing the credits and song contents, respectively
 		"""
+		if Config.WIKI_OFFLINE:
+			raise ValueError(f"Could not retrieve song {self.song_title} from WikiSpiv (offline)")
+
 		url = f"{Config.WIKI_SONG_URL}/{self.song_title}?action=render"
-		r = requests.get(url)
+		r = self._session().request(url)
 
 		if not r.ok:
 			raise ValueError(f"Could not retrieve song {self.song_title} from WikiSpiv (error: {r.status_code})")
 
+		from bs4 import BeautifulSoup
 		soup = BeautifulSoup(r.text, 'html.parser')
 
 		meta_divs = soup.find_all('div', class_='credit')
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from consts import Config
+
+
+"""
+An on-disk cache of WikiSpiv lookups (title resolution and backlinks), keyed on the raw query title.
+Titles WikiSpiv doesn't know are cached too, so we don't keep asking about them.
+"""
+class WikiSpivCache:
+    CACHE_VERSION: int = 1
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'wikispiv_titles.json')
+
+    _instance: Optional['WikiSpivCache'] = None
+
+    def __init__(self, cache_file: str = CACHE_FILE):
+        self.cache_file = cache_file
+        # raw query title -> {"title", "found", "time"}
+        self.titles: Dict[str, Dict] = {}
+        # title -> {"backlinks", "time"}
+        self.backlinks: Dict[str, Dict] = {}
+        self.dirty = False
+        # Songs may be downloaded (and so resolved) from multiple threads
+        self._lock = threading.Lock()
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'WikiSpivCache':
+        """ Returns the shared cache, loading it on first use """
+        if cls._instance is None:
+            cls._instance = WikiSpivCache()
+        return cls._instance
+
+    @staticmethod
+    def _is_fresh(entry: Dict, found: bool = True) -> bool:
+        """ Checks if the given entry hasn't expired yet. 'Not found' results expire separately """
+        ttl_days = Config.WIKI_CACHE_TTL_DAYS if found else Config.WIKI_CACHE_NOT_FOUND_TTL_DAYS
+        return ttl_days is None or time.time() - entry["time"] < ttl_days * 24 * 60 * 60
+
+    def get_title(self, song_title: str) -> Optional[Dict]:
+        """ Returns the cached resolution of this title ({"title", "found"}), or None if we need to ask WikiSpiv """
+        entry = self.titles.get(song_title)
+        if entry and (Config.WIKI_OFFLINE or self._is_fresh(entry, entry["found"])):
+            return entry
+        return None
+
+    def set_title(self, song_title: str, main_title: str, found: bool) -> None:
+        with self._lock:
+            self.titles[song_title] = {"title": main_title, "found": found, "time": time.time()}
+            self.dirty = True
+
+    def get_backlinks(self, title: str) -> Optional[List[str]]:
+        """ Returns the cached backlinks of this title, or None if we need to ask WikiSpiv """
+        entry = self.backlinks.get(title)
+        if entry and (Config.WIKI_OFFLINE or self._is_fresh(entry)):
+            return entry["backlinks"]
+        return None
+
+    def set_backlinks(self, title: str, backlinks: List[str]) -> None:
+        with self._lock:
+            self.backlinks[title] = {"backlinks": backlinks, "time": time.time()}
+            self.dirty = True
+
+    def save(self) -> None:
+        """ Saves the cache (if anything changed) """
+        with self._lock:
+            if not self.dirty:
+                return
+
+            # Written next to the cache, and then swapped in, so an interrupted save leaves the old cache as it was
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(self.cache_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({"version": self.CACHE_VERSION, "titles": self.titles, "backlinks": self.backlinks},
+                          f, ensure_ascii=False)
+            os.replace(self.cache_file + '.tmp', self.cache_file)
+            self.dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if cache.get("version") == self.CACHE_VERSION:
+            self.titles = cache["titles"]
+            self.backlinks = cache["backlinks"]
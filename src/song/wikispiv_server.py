@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from consts import Config
+from song.wikispiv_transport import FixtureStore
+
+
+"""
+A local stand-in for WikiSpiv, serving the recorded API and `?action=render` pages from a fixture store.
+To build against it, point WIKI_ROOT_URL, WIKI_SONG_URL and WIKI_API_URL at http://localhost:<port>
+    ./wikispiv_server.py [port] [fixtures_file]
+"""
+
+
+def create_server(store: FixtureStore, port: int = 0) -> ThreadingHTTPServer:
+    """ Creates (but does not start) a server for the given store. Port 0 picks any free port """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            recorded = store.get(unquote(self.path))
+            if recorded is None:
+                self.send_error(404, f"No recorded response for '{self.path}'")
+                return
+
+            body = recorded["body"].encode('utf-8')
+            self.send_response(recorded["status"])
+            self.send_header('Content-Type', recorded["content_type"])
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(('localhost', port), Handler)
+
+
+if __name__ == '__main__':
+    server_port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    fixtures_file = sys.argv[2] if len(sys.argv) > 2 else Config.WIKI_FIXTURES_FILE
+
+    server = create_server(FixtureStore(fixtures_file), server_port)
+    print(f"Serving {fixtures_file} on http://localhost:{server.server_port}")
+    server.serve_forever()
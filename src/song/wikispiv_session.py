@@ -0,0 +1,33 @@
+from typing import Dict, Optional
+
+import requests
+
+from consts import Config
+from song.wikispiv_transport import create_transport
+
+
+"""
+The session used for every WikiSpiv request.
+Sends requests through the transport selected by Config.WIKI_TRANSPORT (live, record or replay).
+Safe to share between threads.
+"""
+class WikiSpivSession:
+    _instance: Optional['WikiSpivSession'] = None
+
+    def __init__(self, mode: Optional[str] = None):
+        self.transport = create_transport(mode or Config.WIKI_TRANSPORT)
+
+    @classmethod
+    def get(cls) -> 'WikiSpivSession':
+        """ Returns the shared session, creating it on first use """
+        if cls._instance is None:
+            cls._instance = WikiSpivSession()
+        return cls._instance
+
+    def request(self, url: str, params: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Sends a GET request through our transport
+        @param url: The URL to request
+        @param params: The (optional) query parameters
+        """
+        return self.transport.get(url, params)
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from consts import Config
+
+
+"""
+The transports which WikiSpiv requests go through:
+    live - straight to the site
+    record - to the site, saving every response to a fixture store
+    replay - only from a fixture store, never touching the network
+"""
+
+
+class FixtureStore:
+    """
+    Recorded WikiSpiv responses, saved in a single JSON file.
+    Responses are keyed on the path & query of their URL (not the host), so they can be served from anywhere.
+    """
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        # path & query -> {"status", "content_type", "body"}
+        self.responses: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(filepath):
+            with open(filepath, encoding='utf-8') as f:
+                self.responses = json.load(f)
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, str]] = None) -> str:
+        """ Finds the key of a request - the (unquoted) path and query of the URL which would be requested """
+        parsed = urlparse(requests.Request('GET', url, params=params).prepare().url)
+        return unquote(f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.responses.get(key)
+
+    def put(self, key: str, response: requests.Response) -> None:
+        with self._lock:
+            self.responses[key] = {
+                "status": response.status_code,
+                "content_type": response.headers.get('Content-Type', 'text/html; charset=utf-8'),
+                "body": response.text,
+            }
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+            with open(self.filepath, 'w', encoding='utf-8') as f:
+                json.dump(self.responses, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+class LiveTransport:
+    """
+    Sends requests to the site. Keeps connections alive between requests, limits how often we hit each host,
+    and retries failed requests. Safe to share between threads.
+    """
+    # Statuses which are worth retrying; anything else is returned as-is
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=Config.WIKI_MAX_WORKERS, pool_maxsize=Config.WIKI_MAX_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # host -> the earliest time we may send the next request to it
+        self._next_request_time: Dict[str, float] = {}
+        self._rate_lock = threading.Lock()
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Sends a GET request, retrying with an exponential backoff if it fails
+        @param url: The URL to request
+        @param params: The (optional) query parameters
+        @return: The response. Raises the last error if we ran out of retries
+        """
+        for attempt in range(Config.WIKI_RETRIES + 1):
+            last_attempt = attempt == Config.WIKI_RETRIES
+            self._wait_for_turn(url)
+
+            try:
+                response = self.session.get(url, params=params, timeout=Config.WIKI_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES or last_attempt:
+                    return response
+
+            time.sleep(Config.WIKI_BACKOFF * (2 ** attempt))
+
+    def _wait_for_turn(self, url: str) -> None:
+        """ Blocks until we're allowed to send another request to this URL's host """
+        if not Config.WIKI_REQUESTS_PER_SECOND:
+            return
+
+        host = urlparse(url).netloc
+        with self._rate_lock:
+            now = time.monotonic()
+            request_time = max(now, self._next_request_time.get(host, now))
+            self._next_request_time[host] = request_time + 1 / Config.WIKI_REQUESTS_PER_SECOND
+
+        time.sleep(max(0.0, request_time - now))
+
+
+class RecordTransport:
+    """ Sends requests to the site, and saves every response to the fixture store """
+    def __init__(self, store: FixtureStore):
+        self.store = store
+        self.live = LiveTransport()
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> requests.Response:
+        response = self.live.get(url, params)
+        self.store.put(FixtureStore.key(url, params), response)
+        return response
+
+
+class ReplayTransport:
+    """ Serves every request from the fixture store """
+    def __init__(self, store: FixtureStore):
+        self.store = store
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> requests.Response:
+        key = FixtureStore.key(url, params)
+        recorded = self.store.get(key)
+        if recorded is None:
+            raise requests.ConnectionError(f"No recorded response for '{key}'")
+
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.headers['Content-Type'] = recorded["content_type"]
+        response._content = recorded["body"].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+
+def create_transport(mode: str):
+    """ Creates the transport for the given mode (live, record or replay) """
+    if mode == "live":
+        return LiveTransport()
+    if mode == "record":
+        return RecordTransport(FixtureStore(Config.WIKI_FIXTURES_FILE))
+    if mode == "replay":
+        return ReplayTransport(FixtureStore(Config.WIKI_FIXTURES_FILE))
+
+    raise ValueError(f"Unknown WikiSpiv transport '{mode}' (expected live, record or replay)")
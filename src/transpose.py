@@ -0,0 +1,135 @@
+import copy
+import re
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from chords import ChordDictionary
+from consts import Config
+from song.chordpro import LyricLine
+from song.song import Song
+
+
+"""
+Transposes songs into other keys, from the chords they were parsed into (files are never read or parsed again).
+Every transposed chord & song is memoized, so transposing the same songs for several variants of a songbook
+(eg. the standard book, and one in the easiest keys) only transposes each chord once.
+"""
+class Transposer:
+    # Transpose into the key with the fewest unknown & barre chords
+    EASIEST: str = "easiest"
+    # The shifts tried for the easiest key, the smallest first (6 semitones up is the same key as 6 down)
+    SHIFTS: List[int] = sorted(range(-5, 7), key=lambda shift: (abs(shift), shift < 0))
+
+    # The parts of a chord (eg. the chords of Am/E, or of a chord in parentheses) are transposed one by one
+    RE_CHORD_SEPARATOR = re.compile('([/() ])')
+    RE_NOTE = re.compile('^([A-G])([#b]?)')
+    # The keys written with flats, by their tonic (eg. Bb, or Dm); every other key is written with sharps
+    FLAT_MAJOR_KEYS: Set[int] = {1, 3, 5, 8, 10}  # Db, Eb, F, Ab, Bb
+    FLAT_MINOR_KEYS: Set[int] = {0, 2, 3, 5, 7, 10}  # Cm, Dm, Ebm, Fm, Gm, Bbm
+
+    _instance: Optional['Transposer'] = None
+
+    def __init__(self):
+        # (chord, shift, spelled with flats?) -> transposed chord
+        self.chords: Dict[Tuple[str, int, bool], str] = {}
+        # (content hash, shift) -> transposed lyrics & chords
+        self.songs: Dict[Tuple[str, int], Tuple[List[LyricLine], Set[str]]] = {}
+        # (content hash, chords file) -> the shift into the easiest key
+        self.easiest: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def get(cls) -> 'Transposer':
+        """ Returns the shared transposer """
+        if cls._instance is None:
+            cls._instance = Transposer()
+        return cls._instance
+
+    @staticmethod
+    def configured_shift(song: Song, section_name: str) -> Union[int, str]:
+        """ How the given song is configured to be transposed (see Config.TRANSPOSE) """
+        return Config.TRANSPOSE_SONGS.get(song.title, Config.TRANSPOSE_SECTIONS.get(section_name, Config.TRANSPOSE))
+
+    def transpose(self, song: Song, section_name: str) -> Song:
+        """ Transposes a song of the given section as configured """
+        shift = self.configured_shift(song, section_name)
+        if shift == self.EASIEST:
+            shift = self.easiest_shift(song)
+        elif not isinstance(shift, int) or isinstance(shift, bool):
+            raise ValueError(f"Can't transpose {song.title} by {shift!r}; "
+                             f"expected a number of semitones, or \"{self.EASIEST}\"")
+        return self.song(song, shift)
+
+    def chord(self, chord: str, shift: int, flats: bool = False) -> str:
+        """
+        Transposes a chord (as written in a song) by the given number of semitones
+        @param flats: Whether to spell the transposed notes with flats (as in a flat key), rather than sharps
+        """
+        shift %= 12
+        if shift == 0:
+            return chord
+
+        key = (chord, shift, flats)
+        transposed = self.chords.get(key)
+        if transposed is None:
+            parts = self.RE_CHORD_SEPARATOR.split(chord.replace('♭', 'b').replace('♯', '#'))
+            transposed = ''.join(self._transpose_part(part, shift, flats) for part in parts)
+            self.chords[key] = transposed
+        return transposed
+
+    def _transpose_part(self, part: str, shift: int, flats: bool) -> str:
+        # Anything which doesn't start with a note (eg. N.C., or the b5 of C7(b5)) stays as it is
+        match = self.RE_NOTE.match(part)
+        if not match:
+            return part
+        return ChordDictionary.note(match.group(1), match.group(2), shift, flats) + part[match.end():]
+
+    def flat_key(self, song: Song, shift: int) -> bool:
+        """ Whether the song, transposed by the given number of semitones, is in a key written with flats """
+        # We take a song to be in the key of its first chord
+        first = next((chord for line in song.lyrics for _, chord in line.chords
+                      if self.RE_NOTE.match(chord.lstrip('('))), None)
+        if first is None:
+            return False
+
+        symbol = ChordDictionary.parse(self.RE_CHORD_SEPARATOR.split(first.lstrip('('))[0])
+        tonic = (ChordDictionary.NOTES.index(symbol.root) + shift) % 12
+        minor = symbol.quality.startswith('m') and not symbol.quality.startswith('maj')
+        return tonic in (self.FLAT_MINOR_KEYS if minor else self.FLAT_MAJOR_KEYS)
+
+    def song(self, song: Song, shift: int) -> Song:
+        """ A copy of the given song, transposed by the given number of semitones """
+        shift %= 12
+        if shift == 0:
+            return song
+
+        key = (song.content_hash, shift)
+        transposed = self.songs.get(key)
+        if transposed is None:
+            # The chords are spelled the way the key the song ends up in is written (eg. Bb rather than A#)
+            flats = self.flat_key(song, shift)
+            lyrics = [line._replace(chords=tuple((offset, self.chord(chord, shift, flats)) for offset, chord in line.chords))
+                      if line.chords else line for line in song.lyrics]
+            transposed = lyrics, {self.chord(chord, shift, flats) for chord in song.chords}
+            self.songs[key] = transposed
+
+        song = copy.copy(song)
+        song.lyrics, song.chords = transposed
+        song.transposed = shift
+        # A transposed song is measured & rendered as a song of its own
+        song.content_hash = f"{song.content_hash}+{shift}"
+        return song
+
+    def easiest_shift(self, song: Song) -> int:
+        """ The shift into the key in which the song has the fewest unknown chords, and then the fewest barre chords """
+        key = (song.content_hash, Config.CHORDS_FILE)
+        shift = self.easiest.get(key)
+        if shift is None:
+            dictionary = ChordDictionary.get()
+
+            def _difficulty(shift: int) -> Tuple[int, int]:
+                shapes = [dictionary.shape(self.chord(chord, shift)) for chord in song.chords]
+                return sum(shape is None for shape in shapes), sum(shape.barre for shape in shapes if shape)
+
+            # Ties go to the smallest shift
+            shift = min(self.SHIFTS, key=_difficulty)
+            self.easiest[key] = shift
+        return shift
@@ -1,3 +1,7 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
 from consts import Config
 
 class Utils:
@@ -13,4 +17,13 @@ class Utils:
     # Ensure that we don't have any double underscores as a result
     while '__' in string:
         string = string.replace('__', '_')
-    return string
\ No newline at end of file
+    return string
+
+   @classmethod
+   def process_pool(cls, max_workers: Optional[int], initializer: Optional[Callable] = None) -> ProcessPoolExecutor:
+    """
+    Creates a pool of worker processes. Where we can, the workers are forked, so they start out with everything
+    this process has already loaded (eg. the corpus, parsed songs & layouts)
+    """
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=initializer)
@@ -0,0 +1,158 @@
+import os
+import pickle
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from chords import ChordDictionary, ChordShape, ChordSymbol
+from consts import Config
+
+
+"""
+Works out how to play the chords which aren't in the chord dictionary, from the notes in them.
+Every fingering we work out is memoized, and saved between builds.
+"""
+class Voicings:
+    CACHE_FILE: str = os.path.join(Config.CACHE_DIR, 'voicings.pickle')
+    # Bump this whenever the search changes, so that fingerings found by an older version are worked out again
+    GENERATOR_VERSION: int = 1
+
+    # The note (pitch class) of each open string, in standard tuning (lowest first)
+    TUNING: Tuple[int, ...] = (4, 9, 2, 7, 11, 4)
+    # The notes of each quality, in semitones above the root
+    INTERVALS: Dict[str, Tuple[int, ...]] = {
+        '': (0, 4, 7), 'm': (0, 3, 7), '5': (0, 7), 'aug': (0, 4, 8), 'dim': (0, 3, 6), 'dim7': (0, 3, 6, 9),
+        'sus2': (0, 2, 7), 'sus4': (0, 5, 7), '7sus4': (0, 5, 7, 10), '6': (0, 4, 7, 9), 'm6': (0, 3, 7, 9),
+        '7': (0, 4, 7, 10), 'm7': (0, 3, 7, 10), 'maj7': (0, 4, 7, 11), 'mmaj7': (0, 3, 7, 11), 'add9': (0, 4, 7, 2),
+        'madd9': (0, 3, 7, 2), '9': (0, 4, 7, 10, 2), 'm9': (0, 3, 7, 10, 2), 'maj9': (0, 4, 7, 11, 2),
+        '11': (0, 4, 7, 10, 2, 5), '13': (0, 4, 7, 10, 2, 9),
+    }
+    # The most fingers a fingering may take (a barre takes one)
+    MAX_FINGERS: int = 4
+    # The fewest strings a fingering may sound
+    MIN_STRINGS: int = 4
+
+    _instance: Optional['Voicings'] = None
+
+    def __init__(self, cache_file: str = CACHE_FILE):
+        self.cache_file = cache_file
+        # (chord, Config.MAX_FRETS) -> its fingering (or None, if it can't be played)
+        self.shapes: Dict[Tuple[str, int], Optional[ChordShape]] = {}
+        self.dirty = False
+
+        self._load()
+
+    @classmethod
+    def get(cls) -> 'Voicings':
+        """ Returns the shared voicings, loading them on first use """
+        if cls._instance is None:
+            cls._instance = Voicings()
+        return cls._instance
+
+    def shape(self, symbol: ChordSymbol) -> Optional[ChordShape]:
+        """ How the given chord can be played (or None, if we can't work it out) """
+        key = (str(symbol), Config.MAX_FRETS)
+        if key in self.shapes:
+            return self.shapes[key]
+
+        shape = self.generate(symbol)
+        if shape is not None:
+            print(f"Worked out a fingering for chord '{symbol}': {shape.frets} from fret {shape.base}")
+        self.shapes[key] = shape
+        self.dirty = True
+        return shape
+
+    @classmethod
+    def generate(cls, symbol: ChordSymbol) -> Optional[ChordShape]:
+        """ Finds the easiest fingering of a chord: the lowest on the neck, with the most open strings """
+        if symbol.root not in ChordDictionary.NOTES or symbol.quality not in cls.INTERVALS:
+            return None
+
+        root = ChordDictionary.NOTES.index(symbol.root)
+        bass = ChordDictionary.NOTES.index(symbol.bass) if symbol.bass else root
+        intervals = cls.INTERVALS[symbol.quality]
+        notes = {(root + interval) % 12 for interval in intervals} | {bass}
+        # The fifth may be left out of chords with more than three notes
+        required = notes - ({(root + 7) % 12} if len(intervals) > 3 else set())
+
+        best, best_score = None, None
+        for base in range(1, 13):
+            for frets in cls._fingerings(notes, bass, base):
+                if not required <= {(string + fret) % 12 for string, fret in zip(cls.TUNING, frets) if fret >= 0}:
+                    continue
+
+                # Fingerings start at the lowest fret used, like the ones in the dictionary
+                shape = ChordShape(base, tuple(fret - base + 1 if fret > 0 else fret for fret in frets))
+                fretted = [fret for fret in shape.frets if fret > 0]
+                fingers = len(fretted) - (fretted.count(min(fretted)) - 1 if shape.barre else 0)
+                if fingers > cls.MAX_FINGERS:
+                    continue
+
+                score = (shape.barre, base, shape.frets.count(-1), -shape.frets.count(0), fingers)
+                if best_score is None or score < best_score:
+                    best, best_score = shape, score
+
+            # Nothing further up the neck beats a fingering without a barre (nor anything at the nut)
+            if best is not None and not best.barre:
+                break
+
+        return best
+
+    @classmethod
+    def _fingerings(cls, notes: Set[int], bass: int, base: int) -> Iterator[List[int]]:
+        """
+        Every way to play the given notes (each string open, muted, or fretted within reach of the base fret),
+        with the bass note on the lowest string played, and no muted strings between the strings played
+        """
+        top = base + Config.MAX_FRETS - 1
+        frets = [0] + list(range(base, top + 1))
+        options = [[fret for fret in frets if (string + fret) % 12 in notes] for string in cls.TUNING]
+
+        def _search(string: int, fingering: List[int]) -> Iterator[List[int]]:
+            if string == len(cls.TUNING):
+                played = [fret for fret in fingering if fret >= 0]
+                # (starting at the base fret - otherwise, the same fingering has a lower base)
+                lowest = min((fret for fret in played if fret > 0), default=0)
+                if len(played) >= cls.MIN_STRINGS and (base == 1 or base == lowest):
+                    yield fingering
+                return
+
+            playing = any(fret >= 0 for fret in fingering)
+            if playing:
+                # Once we're playing, only the top string may be muted
+                if string == len(cls.TUNING) - 1:
+                    yield from _search(string + 1, fingering + [-1])
+                candidates = options[string]
+            else:
+                # The lowest string played is the bass note
+                if len(cls.TUNING) - string - 1 >= cls.MIN_STRINGS:
+                    yield from _search(string + 1, fingering + [-1])
+                candidates = [fret for fret in options[string] if (cls.TUNING[string] + fret) % 12 == bass]
+
+            for fret in candidates:
+                yield from _search(string + 1, fingering + [fret])
+
+        yield from _search(0, [])
+
+    def merge(self, shapes: Dict[Tuple[str, int], Optional[ChordShape]]) -> None:
+        """ Adds the fingerings worked out by another build (eg. in another process), so they're saved too """
+        if shapes.keys() - self.shapes.keys():
+            self.dirty = True
+        self.shapes.update(shapes)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump((self.GENERATOR_VERSION, self.shapes), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, 'rb') as f:
+                version, shapes = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            return
+
+        if version == self.GENERATOR_VERSION:
+            self.shapes = shapes
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The sources import each other as top-level modules (eg. `from consts import Config`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,44 @@
+from song.chordpro import ChordProSong, Directive, LyricLine
+
+
+SONG = """## Saved from WIKISPIV.com
+{title: Бий барабан}
+{meta: alt_title Коли у путь}
+{subtitle: Мелодія: "When the Saints go Marching In"}
+{category: Козацька}
+
+Коли у [C]путь, коли у путь,
+\tТи[C] пригадай наш [(C7)]давній з[F]вичай:
+ 
+<bold>Приспів:</bold>
+<bold>[Am]Бий барабан</bold>
+"""
+
+
+def test_parse_directives():
+    song = ChordProSong.parse(SONG)
+
+    assert "Бий барабан" == song.title
+    assert ["Коли у путь"] == song.alt_titles
+    assert ["Козацька"] == song.categories
+    assert [Directive("title", "Бий барабан"), Directive("alt_title", "Коли у путь"),
+            Directive("subtitle", 'Мелодія: "When the Saints go Marching In"')] == song.meta
+
+
+def test_parse_lyrics():
+    song = ChordProSong.parse(SONG)
+
+    assert [
+        LyricLine("Коли у путь, коли у путь,", ((7, "C"),)),
+        LyricLine("Ти пригадай наш давній звичай:", ((2, "C"), (16, "(C7)"), (24, "F")), indented=True),
+        LyricLine(""),
+        LyricLine("Приспів:", bold=True),
+        LyricLine("Бий барабан", ((0, "Am"),), bold=True),
+    ] == song.lyrics
+    assert song.lyrics[2].blank and not song.lyrics[3].blank
+    assert {"C", "C7", "F", "Am"} == song.chords
+
+
+def test_segments():
+    line = ChordProSong.parse("Ти[C] пригадай наш [C7][F]звичай")
+    assert [("Ти", "C"), (" пригадай наш ", "C7"), ("", "F"), ("звичай", None)] == line.lyrics[0].segments()
@@ -0,0 +1,43 @@
+import os
+
+from song.corpus import SongCorpus
+
+
+def _write_song(song_dir, filename, text):
+    with open(os.path.join(song_dir, filename), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_find_by_title_alt_title_and_filename(tmp_path):
+    _write_song(tmp_path, "бий_барабан.cho", "{title: Бий барабан}\n{meta: alt_title Коли у путь}\n\n[Am]Бий\n")
+    _write_song(tmp_path, "8ий_колір.cho", "{title: 8-ий колір}\n\nЛя-ля\n")
+    corpus = SongCorpus(str(tmp_path), str(tmp_path / "index.json"))
+
+    expected = os.path.join(str(tmp_path), "бий_барабан.cho")
+    assert expected == corpus.find("Бий барабан")
+    assert expected == corpus.find("КОЛИ У ПУТЬ")
+    assert expected == corpus.find("бий_барабан")
+    assert os.path.join(str(tmp_path), "8ий_колір.cho") == corpus.find("8-ий колір")
+    assert corpus.find("Гімн Пласту") is None
+
+
+def test_index_is_persisted_and_invalidated(monkeypatch, tmp_path):
+    _write_song(tmp_path, "вона.cho", "{title: Вона}\n")
+    index_file = str(tmp_path / "index.json")
+    SongCorpus(str(tmp_path), index_file)
+    assert os.path.exists(index_file)
+
+    # Unchanged files are not re-read
+    def read_entry(filepath, stat):
+        raise AssertionError(f"{filepath} was re-read")
+
+    with monkeypatch.context() as m:
+        m.setattr(SongCorpus, "_read_entry", staticmethod(read_entry))
+        corpus = SongCorpus(str(tmp_path), index_file)
+        assert corpus.find("Вона")
+        assert corpus.content_hash(os.path.join(str(tmp_path), "вона.cho"))
+
+    # A changed file is
+    _write_song(tmp_path, "вона.cho", "{title: Вона}\n{meta: alt_title Завтра прийде}\n")
+    corpus = SongCorpus(str(tmp_path), index_file)
+    assert corpus.find("Завтра прийде")
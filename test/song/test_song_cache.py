@@ -0,0 +1,46 @@
+import os
+
+from song.chordpro import ChordProSong
+from song.corpus import SongCorpus
+from song.song_cache import ParsedSongCache
+
+
+def test_only_changed_songs_are_parsed(monkeypatch, tmp_path):
+    song_dir = tmp_path / "songs"
+    song_dir.mkdir()
+    filepath = str(song_dir / "вона.cho")
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("{title: Вона}\n\n[Am]Завтра прийде\n")
+
+    parsed = []
+    parse_file = ChordProSong.parse_file
+    monkeypatch.setattr(ChordProSong, "parse_file", classmethod(lambda cls, path: parsed.append(path) or parse_file(path)))
+
+    def new_cache():
+        corpus = SongCorpus(str(song_dir), str(tmp_path / "index.json"))
+        return ParsedSongCache(corpus, str(tmp_path / "parsed.pickle"))
+
+    cache = new_cache()
+    assert {"Am"} == cache.parse(filepath).chords
+    cache.save()
+    assert 1 == len(parsed)
+
+    # Loaded from the cache file, without parsing
+    assert "Вона" == new_cache().parse(filepath).title
+    assert 1 == len(parsed)
+
+    # An edited song is parsed again
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("{title: Вона}\n\n[Am]Завтра прийде до [F]кімнати\n")
+    assert {"Am", "F"} == new_cache().parse(filepath).chords
+    assert 2 == len(parsed)
+
+
+def test_cache_of_moved_classes_is_ignored(tmp_path):
+    # A cache pickled before a class it holds was moved can't be loaded; the songs are just parsed again
+    (tmp_path / "songs").mkdir()
+    cache_file = tmp_path / "parsed.pickle"
+    cache_file.write_bytes(b"cno_such_module\nChordProSong\n.")
+
+    corpus = SongCorpus(str(tmp_path / "songs"), str(tmp_path / "index.json"))
+    assert {} == ParsedSongCache(corpus, str(cache_file)).songs
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from chords import ChordDictionary, ChordShape, ChordSymbol
+from consts import Config
+
+
+def test_aliases_and_spellings_are_resolved(monkeypatch, tmp_path):
+    chords = ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle"))
+
+    am = ChordShape(1, (-1, 0, 2, 2, 1, 0))
+    assert am == chords.shape("Am") == chords.shape("Amin") == chords.shape(" Am ")
+    assert ChordSymbol("A", "m", "") == chords.symbol("Amin")
+
+    # Flats are spelled as sharps, whichever way they're written
+    assert "A#m" == str(chords.symbol("B♭min")) == str(chords.symbol("Bbm"))
+    assert chords.shape("A#m") == chords.shape("B♭min")
+    assert ChordSymbol("A", "m", "F") == chords.symbol("Am/F")
+
+    assert chords.shape("Hm") is None
+    assert chords.shape("Am/E7/Am") is None
+
+    # The compiled chords are saved, and only compiled again if the chords file changes
+    monkeypatch.setattr(ChordDictionary, "compile", None)
+    assert chords.chords == ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")).chords
+
+
+def test_compile(tmp_path):
+    shapes, chords, qualities = ChordDictionary.compile({
+        "C": {"base": 1, "frets": [-1, 3, 2, 0, 1, 0]},
+        "C+": {"copy": "Caug"},
+        "Caug": {"base": 1, "frets": [-1, -1, 2, 1, 1, 0]},
+        "Eaug": {"base": 1, "frets": [-1, -1, 2, 1, 1, 0]},
+        "Db": {"base": 1, "frets": [-1, -1, 3, 1, 2, 1]},
+        "C#": {"copy": "Db"},
+    })
+
+    # Chords which are played the same share their fingering
+    assert 3 == len(shapes)
+    assert {"C", "Caug", "Eaug", "C#"} == set(chords)
+    assert chords["Caug"] == chords["Eaug"]
+    assert {"+": "aug"} == qualities
+
+    with pytest.raises(ValueError):
+        ChordDictionary.compile({"C": {"copy": "Cmaj"}, "Cmaj": {"copy": "C"}})
+    with pytest.raises(ValueError):
+        ChordDictionary.compile({"C": {"copy": "Cmaj"}})
+
+    # A quality synonym works for every root
+    chords_file = tmp_path / "chords.json"
+    chords_file.write_text(json.dumps({"C": {"base": 1, "frets": [-1, 3, 2, 0, 1, 0]},
+                                       "Cm": {"base": 3, "frets": [-1, 1, 3, 3, 2, 1]},
+                                       "Cmin": {"copy": "Cm"},
+                                       "Dm": {"base": 1, "frets": [-1, -1, 0, 2, 3, 1]}}))
+    dictionary = ChordDictionary(str(chords_file), str(tmp_path / "chords.pickle"))
+    assert ChordShape(1, (-1, -1, 0, 2, 3, 1)) == dictionary.shape("Dmin")
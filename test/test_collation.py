@@ -0,0 +1,24 @@
+from collation import Collation
+
+
+def test_ukrainian_order(tmp_path):
+    collation = Collation(str(tmp_path / "keys.pickle"))
+    titles = ["Їхав козак", "Йшли селом", "Іди", "Ґанок", "Гей, соколи", "Дума", "Єдина", "Ехо"]
+
+    assert ["Гей, соколи", "Ґанок", "Дума", "Ехо", "Єдина", "Іди", "Їхав козак", "Йшли селом"] == \
+        sorted(titles, key=collation.sort_key)
+
+
+def test_sort_keys_are_persisted(tmp_path):
+    keys_file = str(tmp_path / "keys.pickle")
+    collation = Collation(keys_file)
+    key = collation.sort_key("Їхав козак")
+    collation.save()
+
+    collation = Collation(keys_file)
+    assert key == collation.sort_key("Їхав козак")
+    # The collation table was never needed
+    assert collation._collator is None
+
+    # Keys aren't shared between tailored and untailored collations
+    assert {} == Collation(keys_file, tailored=False).keys
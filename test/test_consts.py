@@ -0,0 +1,47 @@
+import json
+import pickle
+
+import pytest
+
+from consts import BuildConfig, Config
+
+
+def _config_file(tmp_path, name, conf):
+    filepath = tmp_path / name
+    filepath.write_text(json.dumps(conf, ensure_ascii=False), encoding='utf-8')
+    return str(filepath)
+
+
+def test_build_configs_are_independent(monkeypatch, tmp_path):
+    # Whatever a build applies to Config is undone when the test ends
+    for name in BuildConfig.DEFAULTS:
+        monkeypatch.setattr(Config, name, getattr(Config, name))
+
+    small = BuildConfig(_config_file(tmp_path, "small.json", {
+        "PDF_WIDTH": 300, "TITLE_FONT": {"size": 30}, "sections": [["Пісні", ["Пісня 1", " Пісня 2"], True]]}))
+    default = BuildConfig(_config_file(tmp_path, "default.json", {"sections": []}))
+
+    # Creating a build's configuration doesn't change Config, or the other builds
+    assert BuildConfig.DEFAULTS["TITLE_FONT"] == Config.TITLE_FONT
+    assert 30 == small.TITLE_FONT["size"] and Config.TITLE_FONT["family"] == small.TITLE_FONT["family"]
+    assert Config.TITLE_FONT == default.TITLE_FONT
+    assert 300 - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT) == small.USABLE_PAGE_WIDTH
+    assert ["Пісня 1", "Пісня 2"] == small.song_titles()
+
+    with pytest.raises(AttributeError):
+        small.PDF_WIDTH = 400
+    small.TITLE_FONT["size"] = 40
+    assert 30 == small.TITLE_FONT["size"]
+
+    # Applying a build (eg. in a worker process) makes it the configuration, regardless of what was applied before
+    small.apply()
+    assert 300 == Config.PDF_WIDTH and 30 == Config.TITLE_FONT["size"]
+    pickle.loads(pickle.dumps(default)).apply()
+    assert BuildConfig.DEFAULTS["PDF_WIDTH"] == Config.PDF_WIDTH
+    assert BuildConfig.DEFAULTS["TITLE_FONT"] == Config.TITLE_FONT
+
+    # ... or only for a while, after which Config is as it was
+    with small.applied():
+        assert 300 == Config.PDF_WIDTH and 30 == Config.TITLE_FONT["size"]
+    assert BuildConfig.DEFAULTS["PDF_WIDTH"] == Config.PDF_WIDTH
+    assert BuildConfig.DEFAULTS["TITLE_FONT"] == Config.TITLE_FONT
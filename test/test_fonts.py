@@ -0,0 +1,63 @@
+import os
+import re
+import shutil
+
+from fpdf import FPDF
+
+from consts import Config
+from fonts import FONTS_DIR, FontCache
+from render import PDF
+
+
+def test_fonts_match_fpdf(monkeypatch, tmp_path):
+    ttffile = os.path.join(FONTS_DIR, 'ubuntu_light.ttf')
+    # fpdf saves what it parses next to the font, so it gets a copy of its own
+    (tmp_path / "fpdf").mkdir()
+    pdf = FPDF(unit="pt")
+    pdf.add_font(family="Ubuntu Light", fname=shutil.copy(ttffile, str(tmp_path / "fpdf")), uni=True)
+
+    cache = FontCache(str(tmp_path))
+    font = cache.font(ttffile)
+    for key in ['name', 'type', 'desc', 'up', 'ut', 'cw']:
+        assert pdf.fonts["ubuntu light"][key] == font[key]
+    assert ttffile == font['ttffile']
+
+    # The parsed font is saved, and only parsed again if the file changes
+    monkeypatch.setattr(FontCache, "_parse", None)
+    assert font == FontCache(str(tmp_path)).font(ttffile)
+
+
+def test_only_used_fonts_are_added(monkeypatch, tmp_path):
+    monkeypatch.setattr(FontCache, "_instance", FontCache(str(tmp_path)))
+    monkeypatch.setattr(Config, "TITLE_FONT", dict(Config.TITLE_FONT, family="Caveat"))
+    monkeypatch.setattr(Config, "CHORD_FONT", dict(Config.CHORD_FONT, family="Ubuntu"))
+
+    families = FontCache.families()
+    assert {"Caveat", "Ubuntu", Config.BODY_FONT["family"]} <= families and "Ubuntu Light" not in families
+
+    pdf = PDF()
+    assert {family.lower() for family in families} == {font["fontkey"].rstrip('BI') for font in pdf.fonts.values()}
+    assert {"ubuntu", "ubuntuB", "ubuntuI", "caveat"} <= pdf.fonts.keys()
+
+
+def test_shared_files_are_embedded_once(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(Config, "BODY_FONT", dict(Config.BODY_FONT, family="Ubuntu", style=""))
+    monkeypatch.setattr(Config, "TITLE_FONT", dict(Config.TITLE_FONT, family="Ubuntu Light", style="B"))
+
+    pdf = PDF()
+    # Both are ubuntu.ttf
+    assert pdf.fonts["ubuntu"] is pdf.fonts["ubuntu lightB"]
+
+    pdf.render_line("Червона рута", Config.TITLE_FONT)
+    pdf.render_line("Ти признайся мені", Config.BODY_FONT)
+    pdf.output(str(tmp_path / "fonts.pdf"), 'F')
+
+    with open(tmp_path / "fonts.pdf", 'rb') as f:
+        data = f.read()
+    # Both are one file, and the fonts we never selected aren't embedded at all
+    assert data.count(b'/FontFile2') == 1
+    assert re.search(rb'/Font <<\s*/F\d+ \d+ 0 R\s*>>', data)
+    # Both lines, and the page number
+    unique_characters = len(set("Червона рута" + "Ти признайся мені" + "- 1 -"))
+    assert f"ubuntu.ttf (Ubuntu, Ubuntu Light B): {unique_characters} characters" in capsys.readouterr().out
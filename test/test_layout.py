@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+from chords import ChordDictionary
+from consts import Config
+from layout import SongMeasurer
+from layout_cache import LayoutCache
+from render import PDF
+from song.chordpro import ChordProSong
+from song.corpus import SongCorpus
+
+
+VERSE = """Коли у [C]путь, коли у путь,
+\tТи[C] пригадай наш [(C7)]давній з[F]вичай:
+<bold>[Am]Бий барабан</bold>
+
+"""
+
+SONG = """{title: Бий барабан}
+{subtitle: Мелодія: "When the Saints go Marching In", слова: Невідомий автор, записано у таборі над Десною}
+""" + VERSE * 6
+
+# Chord lines are about twice as tall as plain lines, so the most balanced split isn't the one closest to the middle
+NARROW = "[Am]Бий [C]барабан\n" * 6 + "\n" + "Бий барабан\n" * 8 + "\n" + "Бий барабан\n" * 4
+
+
+def _rendered(pdf: PDF, render):
+    pdf.add_page()
+    start_y = pdf.get_y()
+    return render(), pdf.get_y() - start_y
+
+
+def test_measurements_match_rendering(monkeypatch):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    song = ChordProSong.parse(SONG)
+    pdf = PDF()
+
+    _, meta_height = _rendered(pdf, lambda: pdf.render_meta(song.meta))
+    assert meta_height == pdf.measurer.measure_meta(song.meta)
+
+    narrow = ChordProSong.parse(NARROW).lyrics
+    for lines in [song.lyrics, song.lyrics[:4], song.lyrics * 8, narrow, narrow * 6]:
+        lyric_dims, _ = _rendered(pdf, lambda: pdf.render_lyrics(lines, pdf.measurer.measure_song([], lines)))
+        assert lyric_dims == pdf.measurer.measure_lyrics(lines)
+
+
+def test_meta_wraps():
+    song = ChordProSong.parse(SONG)
+    pdf = PDF()
+
+    # The subtitle is too long for a single line
+    assert Config.TITLE_FONT["size"] + 2 * Config.SUBTITLE_FONT["size"] == pdf.measurer.measure_meta(song.meta)
+
+
+def test_chord_diagrams_are_measured(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(Config, "CHORD_HEIGHT", Config.CHORD_STRING_HEIGHT + 3)
+    monkeypatch.setattr(Config, "SONG_CHORD_DIAGRAMS", True)
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    song = ChordProSong.parse(SONG)
+    pdf = PDF()
+
+    # In the order they first come up (C7 is optional, but still shown)
+    diagrams = pdf.song_diagrams(song)
+    assert ["C", "C7", "F", "Am"] == [name for name, _ in diagrams]
+
+    def render():
+        pdf.render_meta(song.meta)
+        pdf.render_song_diagrams(diagrams)
+    _, height = _rendered(pdf, render)
+    assert height == pdf.measurer.measure_meta(song.meta, len(diagrams))
+    assert height > pdf.measurer.measure_meta(song.meta)
+
+
+def test_balanced_split(monkeypatch):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    lines = ChordProSong.parse(NARROW).lyrics
+    measurer = PDF().measurer
+
+    assert 6 == measurer.split_index(lines)
+    layout = measurer.measure_song([], lines)
+    assert 6 == layout.split
+    assert layout.lyrics['h'] < measurer.measure_one_col(lines, 0)[0]['h']
+
+    # Lines which are too wide to fit side by side aren't split at all
+    assert measurer.split_index(ChordProSong.parse(SONG).lyrics) is None
+
+
+def test_layouts_are_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    song_dir = tmp_path / "songs"
+    song_dir.mkdir()
+    filepath = str(song_dir / "бий_барабан.cho")
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(SONG)
+
+    measured = []
+    measure_song = SongMeasurer.measure_song
+    monkeypatch.setattr(SongMeasurer, "measure_song", lambda self, *args: measured.append(args) or measure_song(self, *args))
+
+    corpus = SongCorpus(str(song_dir), str(tmp_path / "index.json"))
+    parsed = ChordProSong.parse(SONG)
+    song = SimpleNamespace(meta=parsed.meta, lyrics=parsed.lyrics, content_hash=corpus.content_hash(filepath))
+    pdf = PDF()
+
+    cache = LayoutCache(corpus, str(tmp_path / "layouts.pickle"))
+    layout = cache.layout(song, pdf.measurer)
+    assert 1 == layout.pages
+    cache.save()
+    assert 1 == len(measured)
+
+    # Loaded from the cache file, without measuring
+    assert layout == LayoutCache(corpus, str(tmp_path / "layouts.pickle")).layout(song, pdf.measurer)
+    assert 1 == len(measured)
+
+    # Changing a layout-relevant setting measures the song again
+    monkeypatch.setattr(Config, "LINE_HEIGHT", Config.LINE_HEIGHT + 1)
+    assert layout != LayoutCache(corpus, str(tmp_path / "layouts.pickle")).layout(song, PDF().measurer)
+    assert 2 == len(measured)
@@ -0,0 +1,28 @@
+import os
+
+from main import _watched_files
+from song.song import Song
+
+
+def test_watched_files_pick_up_changes(monkeypatch, tmp_path):
+    song_dir = tmp_path / "songs"
+    song_dir.mkdir()
+    monkeypatch.setattr(Song, "SONG_DIR", str(song_dir))
+    config_file = tmp_path / "config.json"
+    config_file.write_text('{"sections": []}', encoding='utf-8')
+    song_file = song_dir / "вона.cho"
+    song_file.write_text("{title: Вона}\n\n[Am]Завтра прийде\n", encoding='utf-8')
+    (song_dir / "notes.txt").write_text("не пісня", encoding='utf-8')
+
+    files = _watched_files(str(config_file))
+    assert {str(config_file), str(song_file)} == set(files)
+    assert files == _watched_files(str(config_file))
+
+    # An edited song
+    song_file.write_text("{title: Вона}\n\n[Am]Завтра прийде до [F]кімнати\n", encoding='utf-8')
+    assert files != _watched_files(str(config_file))
+
+    # A file which disappears while we look (eg. saved by renaming a new file over it) is left out, until it's back
+    os.symlink(str(tmp_path / "moved.cho"), str(song_dir / "saving.cho"))
+    config_file.unlink()
+    assert {str(song_file)} == set(_watched_files(str(config_file)))
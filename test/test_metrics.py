@@ -0,0 +1,38 @@
+import os
+import shutil
+
+from fpdf import FPDF
+
+from consts import Config
+from metrics import FontMetrics
+
+
+def _pdf(tmp_path):
+    # fpdf saves what it parses next to the font, so it gets a copy of its own
+    ttffile = shutil.copy(os.path.join(Config.ROOT_DIR, 'assets/fonts/ubuntu.ttf'), str(tmp_path))
+    pdf = FPDF(unit="pt")
+    pdf.add_font(family="Ubuntu", fname=ttffile, uni=True)
+    pdf.add_page()
+    pdf.set_font("Ubuntu", size=9)
+    return pdf
+
+
+def test_widths_match_fpdf(tmp_path):
+    pdf = _pdf(tmp_path)
+    metrics = FontMetrics(pdf.fonts, pdf.k)
+
+    for string in ["Коли у путь, коли у путь,", "Am", " ", "", "Їхав козак ♭ 𝄞"]:
+        assert pdf.get_string_width(string) == metrics.string_width("ubuntu", 9, string)
+
+    strings = ["Ти", " пригадай наш ", "давній з"]
+    assert [pdf.get_string_width(s) for s in strings] == metrics.string_widths("ubuntu", 9, strings)
+
+
+def test_widths_are_cached(tmp_path):
+    pdf = _pdf(tmp_path)
+    metrics = FontMetrics(pdf.fonts, pdf.k)
+    font = {"family": "Ubuntu", "style": "U", "size": 9}
+
+    metrics.string_width(FontMetrics.font_key(font), 9, "Бий барабан")
+    metrics.string_width(FontMetrics.font_key(font), 9, "Бий барабан")
+    assert 1 == metrics.string_width.cache_info().hits
@@ -0,0 +1,45 @@
+from consts import Config
+from layout import SongLayout
+from pagination import Paginator
+
+
+def _layouts(heights, pages=None):
+    pages = pages or [1] * len(heights)
+    return [SongLayout(0, {'h': h, 'w': 0}, None, None, p) for h, p in zip(heights, pages)]
+
+
+def _fits(heights):
+    usable_height = Config.PDF_HEIGHT - Config.PDF_MARGIN_TOP - Config.PDF_MARGIN_BOTTOM
+    return sum(heights) + Config.SONG_MARGIN * (len(heights) - 1) <= usable_height
+
+
+def test_sorted_sections_keep_their_order():
+    heights = [300, 100, 150, 300, 100, 400, 50, 50, 200, 520, 80] * 20
+    pages = Paginator().plan(_layouts(heights), reorder=False)
+
+    assert list(range(len(heights))) == [i for page in pages for i in page]
+    assert all(_fits([heights[i] for i in page]) for page in pages)
+
+    # Never more pages than breaking whenever a song doesn't fit
+    greedy = 1
+    page = []
+    for height in heights:
+        if not _fits(page + [height]):
+            greedy += 1
+            page = []
+        page.append(height)
+    assert len(pages) <= greedy
+
+
+def test_unsorted_sections_fill_pages():
+    heights = [400, 400, 100, 100]
+
+    assert [[0], [1, 2], [3]] == Paginator().plan(_layouts(heights), reorder=False)
+    assert [[0, 2], [1, 3]] == Paginator().plan(_layouts(heights), reorder=True)
+    # Songs aren't moved further than the window
+    assert [[0], [1, 2], [3]] == Paginator(reorder_window=2).plan(_layouts(heights), reorder=True)
+
+
+def test_long_songs_get_their_own_pages():
+    pages = Paginator().plan(_layouts([100, 300, 100, 100], [1, 3, 1, 1]), reorder=False)
+    assert [[0], [1], [2, 3]] == pages
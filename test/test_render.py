@@ -0,0 +1,197 @@
+import os
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from chords import ChordDictionary
+from consts import Config
+from layout_cache import LayoutCache
+from page_cache import PageCache
+from render import PDF, StreamingPDF, render_section
+from song.chordpro import ChordProSong
+
+
+def _objects(filepath):
+    """ Reads every object in a PDF through its cross-reference table """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    xref = int(re.search(rb'startxref\n(\d+)', data).group(1))
+    lines = data[xref:].split(b'\n')
+    assert b'xref' == lines[0]
+
+    objects = {}
+    for n in range(1, int(lines[1].split()[1])):
+        offset = int(lines[2 + n].split()[0])
+        assert data[offset:].startswith(b'%d 0 obj' % n)
+        objects[n] = re.sub(rb'/CreationDate[^\n]*', b'', data[offset:data.index(b'endobj', offset)])
+    return objects
+
+
+def _write(pdf: PDF):
+    link = pdf.add_link()
+    pdf.set_font_obj(Config.BODY_FONT)
+    for i in range(120):
+        pdf.cell(w=0, h=Config.BODY_FONT["size"], ln=1, txt=f"Рядок {i}")
+        if i == 70:
+            pdf.set_link(link, y=pdf.get_y())
+
+    # Link back to a page which was already written out
+    pdf.link(x=0, y=0, w=50, h=10, link=link)
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    pdf = PDF()
+    _write(pdf)
+    pdf.output(str(tmp_path / "memory.pdf"), 'F')
+
+    pdf = StreamingPDF(str(tmp_path / "streamed.pdf"))
+    _write(pdf)
+    # Finished pages are no longer kept in memory
+    assert '' == pdf.pages[1]
+    pdf.output(str(tmp_path / "streamed.pdf"), 'F')
+
+    assert _objects(str(tmp_path / "memory.pdf")) == _objects(str(tmp_path / "streamed.pdf"))
+
+
+def test_streaming_replaces_the_output_only_when_finished(tmp_path):
+    outfile = str(tmp_path / "streamed.pdf")
+    pdf = StreamingPDF(outfile)
+    _write(pdf)
+    pdf.output(outfile, 'F')
+    with open(outfile, 'rb') as f:
+        built = f.read()
+
+    # A build which fails halfway leaves the last PDF as it was
+    pdf = StreamingPDF(outfile)
+    _write(pdf)
+    pdf.discard()
+    with open(outfile, 'rb') as f:
+        assert built == f.read()
+    assert ["streamed.pdf"] == os.listdir(tmp_path)
+
+
+def _song(title: str, verses: int, words: str = "бий барабан"):
+    parsed = ChordProSong.parse(f"{{title: {title}}}\n" + f"[Am]{words}, [C]{words}\n\n" * verses)
+    return SimpleNamespace(title=title, alt_titles=[], categories=[], meta=parsed.meta, lyrics=parsed.lyrics,
+                           content_hash=f"{title}-{verses}-{words}", transposed=0, get_chords=lambda: parsed.chords)
+
+
+@pytest.mark.parametrize("diagrams", [False, True])
+def test_unchanged_pages_are_reused(diagrams, monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(Config, "PAGE_BREAKS", "optimal")
+    # Pages which place chord diagrams draw them again (under the same names) when they're replayed
+    monkeypatch.setattr(Config, "SONG_CHORD_DIAGRAMS", diagrams)
+    monkeypatch.setattr(Config, "CHORD_HEIGHT", Config.CHORD_STRING_HEIGHT + 3)
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    monkeypatch.setattr(LayoutCache, "_instance", LayoutCache(None, str(tmp_path / "layouts.pickle")))
+    cache_file = str(tmp_path / "pages.pickle")
+
+    rendered = []
+    render_song = PDF.render_song
+    monkeypatch.setattr(PDF, "render_song", lambda self, song, **kwargs: rendered.append(song.title) or
+                        render_song(self, song, **kwargs))
+
+    def build(songs, filepath):
+        # Every build loads the pages saved by the last one
+        monkeypatch.setattr(PageCache, "_instance", PageCache(cache_file))
+        pdf = PDF()
+        pdf.render_songs(songs, True)
+        pdf.output(filepath, 'F')
+        PageCache.get().save()
+        rendered_titles = rendered[:]
+        rendered.clear()
+        return rendered_titles
+
+    songs = [_song(f"Пісня {i}", 3 + i % 4) for i in range(12)]
+    assert 12 == len(build(songs, str(tmp_path / "first.pdf")))
+
+    # Nothing changed, so nothing is rendered
+    assert [] == build(songs, str(tmp_path / "second.pdf"))
+    assert _objects(str(tmp_path / "first.pdf")) == _objects(str(tmp_path / "second.pdf"))
+
+    # Only the page of the edited song is rendered again
+    songs[5] = _song("Пісня 5", 4, "гей, барабан")
+    edited = build(songs, str(tmp_path / "edited.pdf"))
+    assert "Пісня 5" in edited and len(edited) < 4
+
+    # Which is the same as rendering everything from scratch
+    cache_file = str(tmp_path / "empty.pickle")
+    assert 12 == len(build(songs, str(tmp_path / "scratch.pdf")))
+    assert _objects(str(tmp_path / "edited.pdf")) == _objects(str(tmp_path / "scratch.pdf"))
+
+
+def test_sections_rendered_separately_match(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(LayoutCache, "_instance", LayoutCache(None, str(tmp_path / "layouts.pickle")))
+    monkeypatch.setattr(PageCache, "_instance", PageCache(str(tmp_path / "pages.pickle")))
+
+    sections = [("Перша", [_song(f"Пісня {i}", 3 + i % 4) for i in range(7)], True),
+                # A song longer than a page
+                ("Друга", [_song("Довга пісня", 40), _song("Коротка пісня", 1)], False),
+                ("Третя", [], False)]
+
+    pdf = PDF()
+    indexes = [pdf.render_songs(songs, sort_by_name) for _, songs, sort_by_name in sections]
+    pdf.output(str(tmp_path / "together.pdf"), 'F')
+
+    # Each section starts on the page the previous one ended on, with page numbers to match
+    pdf = PDF()
+    assert indexes == [pdf.render_fragment(render_section(section)[0]) for section in sections]
+    pdf.output(str(tmp_path / "stitched.pdf"), 'F')
+
+    assert _objects(str(tmp_path / "together.pdf")) == _objects(str(tmp_path / "stitched.pdf"))
+
+
+def test_chord_diagrams_are_drawn_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(Config, "CHORD_HEIGHT", Config.CHORD_STRING_HEIGHT + 3)
+    pdf = StreamingPDF(str(tmp_path / "chords.pdf"))
+    pdf.render_chords(["Am", "Amin", "C"])
+
+    # Aliases of a chord are the same diagram
+    am = pdf.chord_template("Am", 1, [-1, 0, 2, 2, 1, 0])
+    assert 4 == len(pdf.templates)  # Am & C, with their chordboard & finger circle
+
+    # Placing a diagram again only adds a reference to it
+    start = len(pdf.pages[pdf.page])
+    for i in range(100):
+        pdf.place_template(am, 20 + i, 50)
+    assert len(pdf.pages[pdf.page]) - start < 100 * 50
+
+    assert am is pdf.chord_template("Am", 1, [-1, 0, 2, 2, 1, 0])
+    pdf.output(str(tmp_path / "chords.pdf"), 'F')
+
+    forms = [obj for obj in _objects(str(tmp_path / "chords.pdf")).values() if b'/Subtype /Form' in obj]
+    assert 4 == len(forms)
+
+
+def _index(columns, monkeypatch) -> PDF:
+    monkeypatch.setattr(Config, "USABLE_PAGE_WIDTH", Config.PDF_WIDTH - (Config.PDF_MARGIN_RIGHT + Config.PDF_MARGIN_LEFT))
+    monkeypatch.setattr(Config, "INDEX_COLUMNS", columns)
+    pdf = PDF()
+    for _ in range(10):
+        pdf.add_page()
+
+    songs = [{"title": f"Пісня {i}", "page": 1 + i // 20, "categories": []} for i in range(150)]
+    songs[3] = {"title": "Пісня з дуже довгою назвою, " * 4, "page": 1, "categories": ["Табір"]}
+    pdf.render_index([("Гімни", songs[:5]), ("Пісні", songs[5:])])
+    return pdf
+
+
+def test_index_is_laid_out_in_columns(monkeypatch):
+    one, two = _index(1, monkeypatch), _index(2, monkeypatch)
+    assert two.page < one.page
+
+    # Each entry is a single text operation, but for the first lines of titles which don't fit their column
+    rows = [row for _, section in two._measure_index([("", [{"title": "Пісня з дуже довгою назвою, " * 4, "page": 1,
+                                                              "categories": ["Табір"]}])]) for row in section]
+    assert len(rows[0].lines) > 1
+    content = ''.join(two.pages[page] for page in range(11, two.page + 1))
+    assert 150 + len(rows[0].lines) - 1 == content.count(' TJ ET')
+
+    # Entries on the same page share a link
+    assert 8 == len(two.links)
+    assert 150 == sum(len(two.page_links.get(page, [])) for page in range(11, two.page + 1))
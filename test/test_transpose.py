@@ -0,0 +1,80 @@
+from chords import ChordDictionary
+from consts import Config
+from song.chordpro import ChordProSong
+from song.song import Song
+from transpose import Transposer
+
+
+def _song(title: str, text: str) -> Song:
+    parsed = ChordProSong.parse(f"{{title: {title}}}\n" + text)
+    song = object.__new__(Song)
+    song.title, song.alt_titles, song.categories, song.meta = title, [], [], parsed.meta
+    song.lyrics, song.chords, song.content_hash, song.transposed = parsed.lyrics, parsed.chords, title, 0
+    return song
+
+
+def test_chords_are_transposed():
+    transposer = Transposer()
+
+    assert "D" == transposer.chord("C", 2) == transposer.chord("C", -10) == transposer.chord("B♭", 4)
+    assert "C#m7" == transposer.chord("Bm7", 2)
+    assert "Am/E" == transposer.chord("Cm/G", -3)
+    # Every chord of a compound chord, but nothing else
+    assert "(Em)/B7/Em" == transposer.chord("(Am)/E7/Am", 7)
+    assert "D7(b5)" == transposer.chord("C7(b5)", 2)
+    assert "N.C." == transposer.chord("N.C.", 5)
+    assert "Am" == transposer.chord("Am", 12)
+
+    # Transposed chords are memoized
+    transposer.chords[("Am", 1, False)] = "memoized"
+    assert "memoized" == transposer.chord("Am", 13)
+
+    # Spelled with flats, if asked to
+    assert "Bb" == transposer.chord("F", 5, True)
+    assert "Ebm7/Bb" == transposer.chord("Cm7/G", 3, True)
+    assert "A#" == transposer.chord("F", 5)
+
+
+def test_chords_are_spelled_in_the_key_of_the_song():
+    transposer = Transposer()
+
+    def chords(text: str, shift: int):
+        return transposer.song(_song(text, text), shift).chords
+
+    # Flat keys are written with flats, and sharp keys with sharps
+    assert {"Bb", "Eb", "F7"} == chords("[F]Гей, [Bb]гей, [C7]гей\n", 5)
+    assert {"Eb", "Ab", "Bb7"} == chords("[C]Гей, [F]гей, [G7]гей\n", 3)
+    assert {"Ebm", "Abm", "Bb7"} == chords("[Dm]Гей, [Gm]гей, [A7]гей\n", 1)
+    assert {"F#", "B", "C#7"} == chords("[G]Гей, [C]гей, [D7]гей\n", -1)
+    assert {"Gm", "Cm", "D7"} == chords("[Am]Гей, [Dm]гей, [E7]гей\n", -2)
+
+
+def test_songs_are_transposed(monkeypatch, tmp_path):
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    transposer = Transposer()
+    song = _song("Пісня", "[C]Бий бара[F]бан, [G7]бий\n[Am]Гей\n")
+
+    transposed = transposer.song(song, 2)
+    assert 2 == transposed.transposed and 0 == song.transposed
+    assert {"D", "G", "A7", "Bm"} == transposed.chords
+    assert ((0, "D"), (8, "G"), (13, "A7")) == transposed.lyrics[0].chords
+    assert song.lyrics[0].text == transposed.lyrics[0].text
+    # The original is left as it was, and the transposed song is measured & rendered as a song of its own
+    assert {"C", "F", "G7", "Am"} == song.chords
+    assert song.content_hash != transposed.content_hash
+    assert song is transposer.song(song, 0)
+
+    # The easiest key has no barre chords (F, Bm), nor unknown ones
+    shift = transposer.easiest_shift(song)
+    assert not any(ChordDictionary.get().shape(chord).barre for chord in transposer.song(song, shift).chords)
+    assert ChordDictionary.get().shape("F").barre and ChordDictionary.get().shape("Bm").barre
+    assert 0 == transposer.easiest_shift(_song("Інша пісня", "[Am]Гей, [Dm]гей, [E]гей\n"))
+
+    monkeypatch.setattr(Config, "TRANSPOSE", "easiest")
+    monkeypatch.setattr(Config, "TRANSPOSE_SECTIONS", {"Інші": -1})
+    monkeypatch.setattr(Config, "TRANSPOSE_SONGS", {"Пісня": 0})
+    easiest = transposer.transpose(_song("Пісня 2", "[C]Бий бара[F]бан, [G7]бий\n[Am]Гей\n"), "Ліричні")
+    assert transposer.song(song, shift).chords == easiest.chords
+    down = transposer.transpose(_song("Пісня 3", "[C]Бий бара[F]бан, [G7]бий\n[Am]Гей\n"), "Інші")
+    assert {"B", "E", "F#7", "G#m"} == down.chords
+    assert song is transposer.transpose(song, "Інші")
@@ -0,0 +1,49 @@
+from chords import ChordDictionary, ChordShape
+from consts import Config
+from voicings import Voicings
+
+
+def _notes(shape: ChordShape):
+    """ The notes the given fingering plays, lowest first """
+    return [(string + fret + (shape.base - 1 if fret > 0 else 0)) % 12
+            for string, fret in zip(Voicings.TUNING, shape.frets) if fret >= 0]
+
+
+def test_common_chords_are_played_the_usual_way(monkeypatch, tmp_path):
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    dictionary = ChordDictionary.get()
+    for chord in ["C", "G", "D", "A", "E", "Am", "Em", "Dm", "A7", "D7", "G7", "B7", "Cmaj7", "Dsus4"]:
+        assert dictionary.shape(chord) == Voicings.generate(dictionary.symbol(chord)), chord
+
+
+def test_generated_chords_are_playable(monkeypatch, tmp_path):
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    dictionary = ChordDictionary.get()
+    for chord in ["F#m", "Eb", "Ab", "G#m7", "C#dim", "Bbmaj9", "Fm6", "D/F#", "Am/G", "E13", "Gm/D#"]:
+        symbol = dictionary.symbol(chord)
+        shape = Voicings.generate(symbol)
+        assert shape is not None, chord
+        assert max(shape.frets) <= Config.MAX_FRETS
+
+        # Every note of the chord (but perhaps the fifth), nothing else, and the bass note lowest
+        root = ChordDictionary.NOTES.index(symbol.root)
+        notes = {(root + interval) % 12 for interval in Voicings.INTERVALS[symbol.quality]}
+        bass = ChordDictionary.NOTES.index(symbol.bass or symbol.root)
+        played = _notes(shape)
+        assert set(played) <= notes | {bass} and notes - {(root + 7) % 12} <= set(played), chord
+        assert bass == played[0]
+
+    assert Voicings.generate(dictionary.symbol("Cwhatever")) is None
+
+
+def test_generated_chords_are_saved(monkeypatch, tmp_path):
+    monkeypatch.setattr(ChordDictionary, "_instance", ChordDictionary(Config.CHORDS_FILE, str(tmp_path / "chords.pickle")))
+    voicings = Voicings(str(tmp_path / "voicings.pickle"))
+    symbol = ChordDictionary.get().symbol("Am/G")
+    shape = voicings.shape(symbol)
+    assert shape == voicings.shape(symbol)
+    voicings.save()
+
+    # Loaded again, rather than worked out again
+    monkeypatch.setattr(Voicings, "generate", None)
+    assert shape == Voicings(str(tmp_path / "voicings.pickle")).shape(symbol)
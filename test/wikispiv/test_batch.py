@@ -0,0 +1,63 @@
+from consts import Config
+from song.corpus import SongCorpus
+from song.wikispiv import WikiSpivSong
+from song.wikispiv_cache import WikiSpivCache
+from song.wikispiv_session import WikiSpivSession
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def test_resolve_titles_in_batches(monkeypatch, tmp_path):
+    monkeypatch.setattr(WikiSpivCache, "_instance", WikiSpivCache(str(tmp_path / "cache.json")))
+    monkeypatch.setattr(SongCorpus, "_instance", SongCorpus(str(tmp_path), str(tmp_path / "index.json")))
+    monkeypatch.setattr(Config, "WIKI_API_BATCH_SIZE", 2)
+    monkeypatch.setattr(WikiSpivSong, "_get_closest_matching_song_title",
+                        staticmethod(lambda title: "Гімн Пласту" if title == "Гимн пласту" else None))
+
+    pages = {
+        "Гімн Пласту": ["Пластовий гімн", "Цвіт України і краса"],
+        "Бий барабан": ["Коли у путь"],
+    }
+    redirects = {"Пластовий гімн": "Гімн Пласту", "Цвіт України і краса": "Гімн Пласту", "Коли у путь": "Бий барабан"}
+    requests_made = []
+
+    def fake_request(self, url, params=None):
+        requests_made.append(params["titles"])
+        query = {"normalized": [], "redirects": [], "pages": {}}
+        for i, title in enumerate(params["titles"].split('|')):
+            if title[0].islower():
+                query["normalized"].append({"from": title, "to": title.capitalize()})
+                title = title.capitalize()
+            if title in redirects:
+                query["redirects"].append({"from": title, "to": redirects[title]})
+                title = redirects[title]
+            if title in pages:
+                query["pages"][str(i)] = {"title": title, "redirects": [{"title": t} for t in pages[title]]}
+            else:
+                query["pages"][str(-i - 1)] = {"title": title, "missing": ""}
+        return FakeResponse({"query": query})
+
+    monkeypatch.setattr(WikiSpivSession, "request", fake_request)
+
+    resolved = WikiSpivSong.resolve_titles(["Пластовий гімн", "коли у путь", "Бий барабан", "Гимн пласту", "Соловію"])
+    assert {
+        "Пластовий гімн": "Гімн Пласту",
+        "коли у путь": "Бий барабан",
+        "Бий барабан": "Бий барабан",
+        "Гимн пласту": "Гімн Пласту",
+        "Соловію": "Соловію",
+    } == resolved
+    # 5 titles in batches of 2, then the one title found by searching
+    assert 4 == len(requests_made)
+
+    # Everything is now cached
+    monkeypatch.setattr(WikiSpivSession, "request", None)
+    assert "Бий барабан" == WikiSpivSong.standardize_song_name("коли у путь")
+    assert ["Коли у путь"] == WikiSpivCache.get().get_backlinks("Бий барабан")
+    assert {} == WikiSpivSong.resolve_titles(["Пластовий гімн", "Соловію"])
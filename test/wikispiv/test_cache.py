@@ -0,0 +1,65 @@
+import os
+import time
+
+from consts import Config
+from song.wikispiv import WikiSpivSong
+from song.wikispiv_cache import WikiSpivCache
+
+
+def _use_cache(monkeypatch, tmp_path):
+    cache = WikiSpivCache(str(tmp_path / "cache.json"))
+    monkeypatch.setattr(WikiSpivCache, "_instance", cache)
+    return cache
+
+
+def _count_lookups(monkeypatch, closest):
+    calls = []
+
+    def closest_matching(song_title):
+        calls.append(song_title)
+        return closest
+
+    monkeypatch.setattr(WikiSpivSong, "_get_closest_matching_song_title", staticmethod(closest_matching))
+    monkeypatch.setattr(WikiSpivSong, "_get_main_song_title", staticmethod(lambda title: "Гімн Пласту"))
+    return calls
+
+
+def test_resolved_titles_are_cached(monkeypatch, tmp_path):
+    _use_cache(monkeypatch, tmp_path)
+    calls = _count_lookups(monkeypatch, "Пластовий гімн")
+
+    assert "Гімн Пласту" == WikiSpivSong.standardize_song_name("Пластовий гімн")
+    assert "Гімн Пласту" == WikiSpivSong.standardize_song_name("Пластовий гімн")
+    assert ["Пластовий гімн"] == calls
+
+    # The cache survives between runs, once it's saved (at the end of the build, rather than on every lookup)
+    assert not os.path.exists(tmp_path / "cache.json")
+    WikiSpivCache.get().save()
+    _use_cache(monkeypatch, tmp_path)
+    assert "Гімн Пласту" == WikiSpivSong.standardize_song_name("Пластовий гімн")
+    assert 1 == len(calls)
+
+
+def test_not_found_titles_are_cached_and_expire(monkeypatch, tmp_path):
+    cache = _use_cache(monkeypatch, tmp_path)
+    calls = _count_lookups(monkeypatch, None)
+
+    WikiSpivSong.standardize_song_name("Соловію")
+    WikiSpivSong.standardize_song_name("Соловію")
+    assert 1 == len(calls)
+    assert not cache.titles["Соловію"]["found"]
+
+    cache.titles["Соловію"]["time"] = time.time() - (Config.WIKI_CACHE_NOT_FOUND_TTL_DAYS + 1) * 24 * 60 * 60
+    WikiSpivSong.standardize_song_name("Соловію")
+    assert 2 == len(calls)
+
+
+def test_offline_only_uses_cache(monkeypatch, tmp_path):
+    _use_cache(monkeypatch, tmp_path)
+    calls = _count_lookups(monkeypatch, "Пластовий гімн")
+    WikiSpivSong.standardize_song_name("Пластовий гімн")
+
+    monkeypatch.setattr(Config, "WIKI_OFFLINE", True)
+    assert "Гімн Пласту" == WikiSpivSong.standardize_song_name("Пластовий гімн")
+    assert "Бий барабан" == WikiSpivSong.standardize_song_name("Бий барабан")
+    assert 1 == len(calls)
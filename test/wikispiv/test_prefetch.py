@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+
+import requests
+
+from consts import Config
+from song.corpus import SongCorpus
+from song.wikispiv import WikiSpivSong
+from song.wikispiv_transport import LiveTransport
+
+
+def _standardize(title: str) -> str:
+    if title == "Недоступна":
+        raise requests.ConnectionError()
+    return title.replace(" (інша назва)", "")
+
+
+def test_prefetch_downloads_concurrently_and_isolates_failures(monkeypatch, tmp_path):
+    corpus = SongCorpus(str(tmp_path), str(tmp_path / "index.json"))
+    monkeypatch.setattr(SongCorpus, "_instance", corpus)
+    monkeypatch.setattr(WikiSpivSong, "standardize_song_name", classmethod(lambda cls, title: _standardize(title)))
+    monkeypatch.setattr(WikiSpivSong, "_get_backlinks", lambda self, title: [])
+    monkeypatch.setattr("song.local_song.LocalSong.SONG_DIR", str(tmp_path))
+
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def fake_download(self):
+        with lock:
+            running.append(self.song_title)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(self.song_title)
+        if self.song_title == "Соловію":
+            raise ValueError("Could not retrieve song")
+        with open(self.filepath, 'w', encoding='utf-8') as f:
+            f.write(f"{{title: {self.song_title}}}\n")
+
+    monkeypatch.setattr(WikiSpivSong, "download_song", fake_download)
+    # A title which can't be looked up is skipped like a song which can't be downloaded,
+    #   and titles of the same song download it once
+    titles = ["Вона", "Воля", "Соловію", "Водограй", "Вогов", "Недоступна", "Вона (інша назва)"]
+
+    downloaded = WikiSpivSong.prefetch_songs(titles)
+
+    assert 4 == len(downloaded)
+    assert max(max_running) > 1
+    assert corpus.find("Водограй") == os.path.join(str(tmp_path), "водограй.cho")
+    assert corpus.find("Соловію") is None
+
+
+def test_live_transport_retries_with_backoff(monkeypatch):
+    monkeypatch.setattr(Config, "WIKI_BACKOFF", 0)
+    transport = LiveTransport()
+    attempts = []
+
+    class Response:
+        status_code = 200
+
+    def flaky_get(url, params=None, timeout=None):
+        attempts.append(url)
+        if len(attempts) < 3:
+            raise requests.ConnectionError()
+        return Response()
+
+    monkeypatch.setattr(transport.session, "get", flaky_get)
+    assert 200 == transport.get("https://www.wikispiv.com/wiki/Вона").status_code
+    assert 3 == len(attempts)
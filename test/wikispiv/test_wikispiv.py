@@ -1,4 +1,22 @@
-from src.song import *
+import threading
+
+import pytest
+
+from consts import Config
+from song.local_song import LocalSong
+from song.wikispiv import WikiSpivSong
+from song.wikispiv_cache import WikiSpivCache
+from song.wikispiv_server import create_server
+from song.wikispiv_session import WikiSpivSession
+from song.wikispiv_transport import FixtureStore
+from utils import Utils
+
+
+@pytest.fixture(autouse=True)
+def replay(monkeypatch, tmp_path):
+    """ Serve every WikiSpiv request from the recorded fixtures, with an empty cache """
+    monkeypatch.setattr(WikiSpivSession, "_instance", WikiSpivSession("replay"))
+    monkeypatch.setattr(WikiSpivCache, "_instance", WikiSpivCache(str(tmp_path / "cache.json")))
 
 
 def test_title_search():
@@ -7,47 +25,73 @@ def test_title_search():
               "Пластовий гімн", "Бий барабан", "Коли у путь", "Горить ватра"]
 
     for title in titles:
-        assert title == songtitle_search(title.upper())
-        assert title == songtitle_search(title.lower())
-        assert title == songtitle_search(title.capitalize())
-        assert title == songtitle_search(title.replace(' ', '_'))
+        assert title == WikiSpivSong._get_closest_matching_song_title(title.upper())
+        assert title == WikiSpivSong._get_closest_matching_song_title(title.lower())
+        assert title == WikiSpivSong._get_closest_matching_song_title(title.capitalize())
+        assert title == WikiSpivSong._get_closest_matching_song_title(title.replace(' ', '_'))
 
 
 
 def test_get_main_title():
-    assert "Гімн Пласту" == get_main_title("Цвіт України і краса")
-    assert "Гімн Пласту" == get_main_title("Пластовий гімн")
-    assert "Гімн Пласту" == get_main_title("Гімн Пласту")
+    assert "Гімн Пласту" == WikiSpivSong._get_main_song_title("Цвіт України і краса")
+    assert "Гімн Пласту" == WikiSpivSong._get_main_song_title("Пластовий гімн")
+    assert "Гімн Пласту" == WikiSpivSong._get_main_song_title("Гімн Пласту")
 
-    assert "Бий барабан" == get_main_title("Коли у путь")
-    assert "Бий барабан" == get_main_title("Бий барабан")
+    assert "Бий барабан" == WikiSpivSong._get_main_song_title("Коли у путь")
+    assert "Бий барабан" == WikiSpivSong._get_main_song_title("Бий барабан")
 
 
 def test_get_backlinks():
-    assert [] == get_backlinks("Цвіт України і краса")
-    assert [] == get_backlinks("Пластовий гімн")
-    assert {"Пластовий гімн", "Цвіт України і краса"} == set(get_backlinks("Гімн Пласту"))
+    assert [] == WikiSpivSong._get_backlinks("Цвіт України і краса")
+    assert [] == WikiSpivSong._get_backlinks("Пластовий гімн")
+    assert {"Пластовий гімн", "Цвіт України і краса"} == set(WikiSpivSong._get_backlinks("Гімн Пласту"))
 
-    assert [] == get_backlinks("Коли у путь")
-    assert {"Коли у путь"} == set(get_backlinks("Бий барабан"))
+    assert [] == WikiSpivSong._get_backlinks("Коли у путь")
+    assert {"Коли у путь"} == set(WikiSpivSong._get_backlinks("Бий барабан"))
 
 def test_snake_case():
-    assert "цвіт_україни_і_краса" == snake_case("Цвіт України і краса")
-    assert "алилуя_в_хатині_тихій_чарівній" == snake_case("Алилуя (В хатині тихій чарівній)")
-    assert "без_природи_нас_нема" == snake_case("Без природи, нас нема")
-    assert "ukraeenska_mova" == snake_case("Ukraeenska mova")
-    assert "ride_kozak_ride" == snake_case("Ride, kozak, ride")
-    assert "koobassa_osyledtsee" == snake_case("Koobassa / Osyledtsee")
-    assert "borscht" == snake_case("B.O.R.S.C.H.T.")
+    assert "цвіт_україни_і_краса" == Utils.snake_case("Цвіт України і краса")
+    assert "алилуя_в_хатині_тихій_чарівній" == Utils.snake_case("Алилуя (В хатині тихій чарівній)")
+    assert "без_природи_нас_нема" == Utils.snake_case("Без природи, нас нема")
+    assert "ukraeenska_mova" == Utils.snake_case("Ukraeenska mova")
+    assert "ride_kozak_ride" == Utils.snake_case("Ride, kozak, ride")
+    assert "koobassa_osyledtsee" == Utils.snake_case("Koobassa / Osyledtsee")
+    assert "borscht" == Utils.snake_case("B.O.R.S.C.H.T.")
 
 
 def test_song_filename():
-    assert "цвіт_україни_і_краса.cho" == song_filename("Цвіт України і краса")
-    assert "алилуя_в_хатині_тихій_чарівній.cho" == song_filename("Алилуя (В хатині тихій чарівній)")
-    assert "без_природи_нас_нема.cho" == song_filename("Без природи, нас нема")
-    assert "ukraeenska_mova.cho" == song_filename("Ukraeenska mova")
-    assert "ride_kozak_ride.cho" == song_filename("Ride, kozak, ride")
-    assert "koobassa_osyledtsee.cho" == song_filename("Koobassa / Osyledtsee")
-    assert "borscht.cho" == song_filename("B.O.R.S.C.H.T.")
+    assert "цвіт_україни_і_краса.cho" == LocalSong._standardize_filename("Цвіт України і краса")
+    assert "алилуя_в_хатині_тихій_чарівній.cho" == LocalSong._standardize_filename("Алилуя (В хатині тихій чарівній)")
+    assert "без_природи_нас_нема.cho" == LocalSong._standardize_filename("Без природи, нас нема")
+    assert "ukraeenska_mova.cho" == LocalSong._standardize_filename("Ukraeenska mova")
+    assert "ride_kozak_ride.cho" == LocalSong._standardize_filename("Ride, kozak, ride")
+    assert "koobassa_osyledtsee.cho" == LocalSong._standardize_filename("Koobassa / Osyledtsee")
+    assert "borscht.cho" == LocalSong._standardize_filename("B.O.R.S.C.H.T.")
+
+
+def test_convert_song_to_chordpro(monkeypatch):
+    monkeypatch.setattr(WikiSpivSong, "__init__", lambda self, title: None)
+    ws = WikiSpivSong("Коли у путь")
+    ws.song_title = "Бий барабан"
+    ws.alt_titles = WikiSpivSong._get_backlinks("Бий барабан")
+
+    chordpro = ws._convert_song_to_chordpro(*ws._download_raw_song())
+    assert chordpro.startswith("## Saved from WIKISPIV.com\n{title: Бий барабан}\n{meta: alt_title Коли у путь}\n")
+    assert "Коли у [C]путь, коли у путь,\n" in chordpro
+    assert "<bold>Приспів:</bold>\n\tБий барабан, бий барабан,\n[C] [G7] [C]" in chordpro
+
 
+def test_stand_in_server(monkeypatch):
+    server = create_server(FixtureStore(Config.WIKI_FIXTURES_FILE))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        root_url = f"http://localhost:{server.server_port}"
+        monkeypatch.setattr(Config, "WIKI_API_URL", f"{root_url}/api.php?format=json")
+        monkeypatch.setattr(Config, "WIKI_SONG_URL", f"{root_url}/wiki")
+        monkeypatch.setattr(WikiSpivSession, "_instance", WikiSpivSession("live"))
 
+        assert "Бий барабан" == WikiSpivSong.standardize_song_name("коли у путь".upper())
+        assert not WikiSpivSession.get().request(f"{Config.WIKI_SONG_URL}/Соловію?action=render").ok
+    finally:
+        server.shutdown()
+        server.server_close()